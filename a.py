@@ -1,9 +1,37 @@
-import tkinter as tk
-from tkinter import messagebox, ttk
+try:
+    import tkinter as tk
+    from tkinter import font as tkfont, messagebox, ttk
+except ImportError:  # headless installs only run the booking service
+    tk = tkfont = messagebox = ttk = None
+try:
+    import numpy as np
+except ImportError:  # the long-range reports need numpy, everything else runs without it
+    np = None
 import sqlite3
-import random
+import json
+import asyncio
+import sys
+import os
+import hashlib
+import hmac
+import secrets
 from datetime import datetime, timedelta
 import re
+import bisect
+import heapq
+import itertools
+import traceback
+import queue
+import threading
+import weakref
+from array import array
+from time import monotonic, perf_counter
+from contextlib import contextmanager
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import urlparse, parse_qs
 
 BG_COLOR = "#f5f5f5"
 PRIMARY_COLOR = "#34495e"
@@ -15,20 +43,1080 @@ HEADER_FONT = ("Segoe UI", 14, "bold")
 BUTTON_STYLE = {"bg": SECONDARY_COLOR, "fg": "white", "font": FONT, "borderwidth": 1}
 ENTRY_STYLE = {"font": FONT, "borderwidth": 1, "relief": "solid"}
 
+DATABASE_PATH = "barberdb.db"
+CACHE_SIZE_KB = 16384
+MMAP_SIZE = 64 * 1024 * 1024
+BUSY_TIMEOUT_MS = 5000
+READER_CONNECTIONS = 4
+GROUP_COMMIT_MS = 0  # >0 lets the booking service commit writes in groups this many ms apart
+
+HOLD_MINUTES = 15
+MAX_RANGE_DAYS = 90  # longest span one availability range or next-free-slot search may cover
+AVAILABILITY_CACHED_DAYS = 120  # days AvailabilityEngine keeps, least recently used dropped first
+BOOKING_PAGE_SIZE = 100
+VIRTUAL_PAGE_SIZE = 100
+VIRTUAL_CACHED_PAGES = 20
+CREDENTIAL_TTL = 300  # seconds a cached login or staff lookup is trusted
+SESSION_TTL = 900  # seconds of inactivity before a login has to be repeated
+
+# password hashing cost; "python a.py calibrate-hash [ms]" suggests values for this machine
+SNAPSHOT_PATH = "barberdb.snapshot"
+SNAPSHOT_INTERVAL = 600  # seconds between appends to the columnar snapshot
+ANALYTICS_BACKEND = "sql"  # "numpy" answers the dashboard and /analytics from NumpyAnalytics instead
+
+HASH_ALGORITHM = "scrypt"
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+PBKDF2_ITERATIONS = 600000
+HASH_TARGET_MS = 100
+LOGIN_WORKERS = 2
+LOGIN_BURST = 5  # login attempts allowed per email before throttling
+LOGIN_REFILL_SECONDS = 30  # one more attempt allowed per email after this long
+
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8080
+SERVICE_WORKERS = 8
+ASYNC_MAX_PENDING = 256
+MAX_BACKOFF = 300  # longest wait after repeated "database is locked" errors
+
+OPENING_TIME = "09:00"
+CLOSING_TIME = "18:00"
+SLOT_MINUTES = 60
+
+
+def time_to_minutes(time_text):
+    hours, minutes = str(time_text).split(":")[:2]
+    return int(hours) * 60 + int(minutes)
+
+
+def minutes_to_time(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def parse_duration(duration, default=SLOT_MINUTES):
+    # Estimated_Time / Duration are stored as 45 or as text like "45 min"
+    match = re.match(r"\s*(\d+)", str(duration)) if duration is not None else None
+    if match and int(match.group(1)) > 0:
+        return int(match.group(1))
+    return default
+
+
+class AvailabilityEngine:
+    def __init__(self, db, opening_time=OPENING_TIME, closing_time=CLOSING_TIME, step=SLOT_MINUTES,
+                 cached_days=AVAILABILITY_CACHED_DAYS):
+        self.db = db
+        self.opening = time_to_minutes(opening_time)
+        self.closing = time_to_minutes(closing_time)
+        self.step = step
+        self.chairs = None  # active ChairIDs, loaded on first use
+        self.days = OrderedDict()  # date -> {ChairID: sorted list of (start, end, BookingID, ExpiryTime)}
+        self.cached_days = cached_days
+        self.booking_dates = {}  # BookingID -> (date, ChairID), so removals don't need the date
+        self.version = None  # DataVersion 'availability' the cached days are valid for
+        self.lock = threading.RLock()  # day lists are replaced, never edited, so readers need no lock
+
+    def sync(self):
+        # drops every cached day once another connection has changed bookings, haircuts or chairs.
+        # A lower version than ours is our own write still waiting to commit, so it is not stale
+        version = self.db.query_one(AVAILABILITY_VERSION_SQL)[0]
+        with self.lock:
+            if self.version is not None and version > self.version:
+                self.chairs = None
+                self.days.clear()
+                self.booking_dates.clear()
+            if self.version is None or version > self.version:
+                self.version = version
+
+    def advance(self, before, after):
+        # our own write moved the version from before to after and the cache was updated to match
+        with self.lock:
+            if self.version == before:
+                self.version = after
+
+    def active_chairs(self):
+        if self.chairs is None:
+            self.chairs = [row[0] for row in self.db.query("SELECT ChairID FROM Chair WHERE Active = 1 ORDER BY ChairID")]
+        return self.chairs
+
+    def load_day(self, date):
+        rows = self.db.query("""
+            SELECT Booking.BookingID, Booking.Time,
+                   COALESCE(Booking.Duration, Haircut.Estimated_Time),
+                   Booking.Locked, Booking.ExpiryTime, Booking.ChairID
+            FROM Booking
+            LEFT JOIN Haircut ON Booking.HaircutID = Haircut.HaircutID
+            WHERE Booking.Date = ?
+            AND (Booking.Locked = 1 OR Booking.ExpiryTime IS NOT NULL)
+        """, (date,))
+        return self.set_day(date, rows)
+
+    def load_range(self, start_date, end_date):
+        rows = self.db.query("""
+            SELECT Booking.Date, Booking.BookingID, Booking.Time,
+                   COALESCE(Booking.Duration, Haircut.Estimated_Time),
+                   Booking.Locked, Booking.ExpiryTime, Booking.ChairID
+            FROM Booking
+            LEFT JOIN Haircut ON Booking.HaircutID = Haircut.HaircutID
+            WHERE Booking.Date BETWEEN ? AND ?
+            AND (Booking.Locked = 1 OR Booking.ExpiryTime IS NOT NULL)
+            ORDER BY Booking.Date
+        """, (start_date, end_date))
+
+        rows_by_date = {}
+        for date, rows in itertools.groupby(rows, key=lambda row: row[0]):
+            rows_by_date[date] = [row[1:] for row in rows]
+
+        dates = []
+        day = datetime.strptime(start_date, "%Y-%m-%d")
+        last_day = datetime.strptime(end_date, "%Y-%m-%d")
+        while day <= last_day:
+            date = day.strftime("%Y-%m-%d")
+            self.set_day(date, rows_by_date.get(date, []))
+            dates.append(date)
+            day += timedelta(days=1)
+        return dates
+
+    def free_starts_range(self, start_date, end_date, duration=SLOT_MINUTES, now=None):
+        self.sync()
+        free = {}
+        for date in self.load_range(start_date, end_date):
+            free[date] = self.day_free_starts(date, duration, now)
+        return free
+
+    def set_day(self, date, rows):
+        with self.lock:
+            return self.replace_day(date, rows)
+
+    def replace_day(self, date, rows):
+        for intervals in self.days.get(date, {}).values():
+            for interval in intervals:
+                self.booking_dates.pop(interval[2], None)
+
+        chairs = {}
+        for booking_id, time, duration, locked, expiry, chair in rows:
+            if chair is None:
+                chair = self.active_chairs()[0] if self.active_chairs() else 1
+            start = time_to_minutes(time)
+            interval = (start, start + parse_duration(duration), booking_id, None if locked else expiry)
+            chairs.setdefault(chair, []).append(interval)
+            self.booking_dates[booking_id] = (date, chair)
+        for intervals in chairs.values():
+            intervals.sort(key=lambda interval: interval[0])
+        self.days[date] = chairs
+        self.days.move_to_end(date)
+        while len(self.days) > self.cached_days:
+            _, evicted = self.days.popitem(last=False)
+            for intervals in evicted.values():
+                for interval in intervals:
+                    self.booking_dates.pop(interval[2], None)
+        return chairs
+
+    def slot_time(self, time):
+        # Booking.Time is zero-padded HH:MM on the slot grid; START_MINUTES_SQL and the rollups rely on it
+        try:
+            parsed = datetime.strptime(str(time), "%H:%M")
+        except ValueError:
+            raise ValidationError("Please enter the time as HH:MM")
+        start = parsed.hour * 60 + parsed.minute
+        if start < self.opening or start >= self.closing or (start - self.opening) % self.step:
+            raise ValidationError(f"Bookings start every {self.step} minutes from "
+                                  f"{minutes_to_time(self.opening)} to {minutes_to_time(self.closing - self.step)}")
+        return minutes_to_time(start)
+
+    def day(self, date):
+        chairs = self.days.get(date)
+        if chairs is None:
+            return self.load_day(date)
+        with self.lock:
+            if date in self.days:
+                self.days.move_to_end(date)
+        return chairs
+
+    def busy_blocks(self, date, chair, now=None):
+        # merges live intervals so the sweeps below only see disjoint, sorted blocks
+        if now is None:
+            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        blocks = []
+        for start, end, booking_id, expiry in self.day(date).get(chair, []):
+            if expiry is not None and expiry <= now:
+                continue
+            if blocks and start < blocks[-1][1]:
+                blocks[-1][1] = max(blocks[-1][1], end)
+            else:
+                blocks.append([start, end])
+        return blocks
+
+    def free_starts(self, date, duration=SLOT_MINUTES, now=None):
+        self.sync()
+        return self.day_free_starts(date, duration, now)
+
+    def day_free_starts(self, date, duration=SLOT_MINUTES, now=None):
+        # free_starts without the staleness check, for callers that have just synced
+        duration = parse_duration(duration)
+        chairs = [[self.busy_blocks(date, chair, now), 0] for chair in self.active_chairs()]
+        free = []
+        for start in range(self.opening, self.closing - duration + 1, self.step):
+            for chair in chairs:
+                blocks = chair[0]
+                while chair[1] < len(blocks) and blocks[chair[1]][1] <= start:
+                    chair[1] += 1
+                if chair[1] == len(blocks) or blocks[chair[1]][0] >= start + duration:
+                    free.append(minutes_to_time(start))
+                    break
+        return free
+
+    def free_chairs(self, date, time, duration=SLOT_MINUTES, now=None):
+        start = time_to_minutes(time)
+        end = start + parse_duration(duration)
+        if start < self.opening or end > self.closing:
+            return []
+        self.sync()
+        free = []
+        for chair in self.active_chairs():
+            blocks = self.busy_blocks(date, chair, now)
+            index = bisect.bisect_right(blocks, start, key=lambda block: block[1])
+            if index == len(blocks) or blocks[index][0] >= end:
+                free.append(chair)
+        return free
+
+    def is_free(self, date, time, duration=SLOT_MINUTES, now=None):
+        return bool(self.free_chairs(date, time, duration, now))
+
+    def add_booking(self, booking_id, date, time, duration, expiry=None, chair=None):
+        # a freshly loaded day has the row only if it is already committed, so it is always added here
+        self.day(date)
+        with self.lock:
+            if date not in self.days:
+                return
+            self.remove_booking(booking_id)
+            if chair is None:
+                chair = self.active_chairs()[0]
+            start = time_to_minutes(time)
+            chairs = dict(self.days[date])
+            intervals = list(chairs.get(chair, []))
+            bisect.insort(intervals, (start, start + parse_duration(duration), booking_id, expiry),
+                          key=lambda interval: interval[0])
+            chairs[chair] = intervals
+            self.days[date] = chairs
+            self.booking_dates[booking_id] = (date, chair)
+
+    def confirm_booking(self, booking_id):
+        with self.lock:
+            date, chair = self.booking_dates.get(booking_id, (None, None))
+            if date in self.days:
+                chairs = dict(self.days[date])
+                chairs[chair] = [interval[:3] + (None,) if interval[2] == booking_id else interval
+                                 for interval in chairs.get(chair, [])]
+                self.days[date] = chairs
+
+    def remove_booking(self, booking_id):
+        with self.lock:
+            date, chair = self.booking_dates.pop(booking_id, (None, None))
+            if date in self.days:
+                chairs = dict(self.days[date])
+                chairs[chair] = [interval for interval in chairs.get(chair, []) if interval[2] != booking_id]
+                self.days[date] = chairs
+
+    def invalidate(self, date=None):
+        with self.lock:
+            if date is None:
+                self.chairs = None
+                self.days.clear()
+                self.booking_dates.clear()
+            elif date in self.days:
+                self.replace_day(date, [])
+                del self.days[date]
+
+
+def connect_database(path=DATABASE_PATH, readonly=False):
+    if readonly:
+        connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        connection.execute("PRAGMA query_only = 1")
+    else:
+        connection = sqlite3.connect(path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode = WAL")  # readers no longer block the booking writer
+    connection.execute("PRAGMA synchronous = NORMAL")
+    connection.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KB}")
+    connection.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    connection.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    return connection
+
+
+class ReaderLease:
+    def __init__(self, connection, idle_readers):
+        self.connection = connection
+        # runs on release_reader, or when the thread holding the lease exits
+        self.release = weakref.finalize(self, idle_readers.put, connection)
+
+
+class ConnectionPool:
+    def __init__(self, path=DATABASE_PATH, readers=READER_CONNECTIONS):
+        self.path = path
+        self.max_readers = readers
+        self.created_readers = 0
+        self.idle_readers = queue.Queue()
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.write_lock = threading.RLock()
+        self.writer_connection = connect_database(path)
+
+    def writer(self):
+        return self.writer_connection
+
+    def reader(self):
+        # each thread keeps the read-only connection it checked out until release_reader
+        lease = getattr(self.local, "lease", None)
+        if lease is not None:
+            return lease.connection
+
+        connection = None
+        try:
+            connection = self.idle_readers.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                if self.created_readers < self.max_readers:
+                    self.created_readers += 1
+                    connection = connect_database(self.path, readonly=True)
+            if connection is None:
+                connection = self.idle_readers.get()
+
+        self.local.lease = ReaderLease(connection, self.idle_readers)
+        return connection
+
+    def release_reader(self):
+        lease = getattr(self.local, "lease", None)
+        if lease is not None:
+            self.local.lease = None
+            lease.release()
+
+    def close(self):
+        self.release_reader()
+        while not self.idle_readers.empty():
+            self.idle_readers.get_nowait().close()
+        self.writer_connection.close()
+
+
+class HoldExpiryIndex:
+    def __init__(self):
+        self.heap = []  # (ExpiryTime, BookingID), soonest first
+        self.lock = threading.Lock()
+        self.listener = None
+
+    def load(self, rows):
+        with self.lock:
+            self.heap = [(expiry, booking_id) for expiry, booking_id in rows]
+            heapq.heapify(self.heap)
+        self.changed()
+
+    def push(self, expiry, booking_id):
+        with self.lock:
+            heapq.heappush(self.heap, (expiry, booking_id))
+            is_next = self.heap[0] == (expiry, booking_id)
+        if is_next:
+            self.changed()
+
+    def changed(self):
+        if self.listener is not None:
+            self.listener()
+
+    def seconds_until_next(self):
+        with self.lock:
+            if not self.heap:
+                return None
+            expiry = self.heap[0][0]
+        return (datetime.strptime(expiry, "%Y-%m-%d %H:%M:%S") - datetime.now()).total_seconds()
+
+    def pop_due(self):
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        due = []
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                due.append(heapq.heappop(self.heap))
+        return due
+
+
+class MaintenanceScheduler(threading.Thread):
+    def __init__(self, path=DATABASE_PATH, results=None):
+        super().__init__(name="maintenance", daemon=True)
+        self.path = path
+        self.results = results if results is not None else queue.Queue()
+        self.jobs = []  # [next_run, name, interval, job, failures]
+        self.wake = threading.Condition()
+        self.stopped = False
+        self.holds = None
+
+    def watch_holds(self, holds):
+        holds.listener = self.notify
+        self.holds = holds
+        self.notify()
+
+    def notify(self):
+        with self.wake:
+            self.wake.notify()
+
+    def add_job(self, name, interval, job):
+        with self.wake:
+            self.jobs.append([monotonic() + interval, name, interval, job, 0])
+            self.wake.notify()
+
+    def stop(self):
+        with self.wake:
+            self.stopped = True
+            self.wake.notify()
+
+    def run(self):
+        connection = connect_database(self.path)  # never shares the UI's connection
+        try:
+            while True:
+                with self.wake:
+                    while not self.stopped:
+                        delays = [entry[0] - monotonic() for entry in self.jobs]
+                        if self.holds is not None and self.holds.heap:
+                            delays.append(self.holds.seconds_until_next())
+                        # sleeps until the next job or hold expiry, or forever when idle
+                        delay = min(delays, default=None)
+                        if delay is not None and delay <= 0:
+                            break
+                        self.wake.wait(delay)
+                    if self.stopped:
+                        return
+                    entry = min(self.jobs, key=lambda job: job[0], default=None)
+                if self.holds is not None:
+                    self.expire_holds(connection)
+                if entry is not None and entry[0] <= monotonic():
+                    self.run_job(entry, connection)
+        finally:
+            connection.close()
+
+    def expire_holds(self, connection):
+        due = self.holds.pop_due()
+        if not due:
+            return
+        expired = []
+        try:
+            with connection:
+                for expiry, booking_id in due:
+                    # a hold that was paid for in the meantime is Locked and stays
+                    deleted = connection.execute('''
+                        DELETE FROM Booking
+                        WHERE BookingID = ? AND Locked = 0 AND ExpiryTime <= ?
+                    ''', (booking_id, expiry)).rowcount
+                    if deleted:
+                        expired.append(booking_id)
+        except sqlite3.OperationalError as error:
+            for expiry, booking_id in due:
+                self.holds.push(expiry, booking_id)
+            self.results.put(("expired_holds", error))
+            with self.wake:
+                self.wake.wait(1)  # retry shortly rather than spinning on a busy database
+            return
+        if expired:
+            self.results.put(("expired_holds", expired))
+
+    def run_job(self, entry, connection):
+        next_run, name, interval, job, failures = entry
+        try:
+            result = job(connection)
+            entry[4] = 0
+            entry[0] = monotonic() + interval
+            self.results.put((name, result))
+        except sqlite3.OperationalError as error:
+            connection.rollback()
+            if "locked" not in str(error) and "busy" not in str(error):
+                entry[0] = monotonic() + interval
+                self.results.put((name, error))
+                return
+            # the booking path holds the write lock, wait longer each time
+            entry[4] = failures + 1
+            entry[0] = monotonic() + min(interval * 2 ** entry[4], MAX_BACKOFF)
+
+
+# fixed-size records appended to SNAPSHOT_PATH, so the whole file can be np.memmap'd as one array
+SNAPSHOT_FIELDS = [
+    ("booking_id", "<i8"),
+    ("date", "<M8[D]"),
+    ("hour", "<i4"),
+    ("customer", "<i4"),
+    ("haircut", "<i4"),
+    ("locked", "?"),
+    ("price", "<f8"),
+]
+
+SNAPSHOT_ROWS_SQL = '''
+    SELECT
+        BookingID,
+        CASE WHEN Date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]' THEN Date END,
+        COALESCE(CASE WHEN Time GLOB '[0-9][0-9]:*' THEN CAST(substr(Time, 1, 2) AS INTEGER) END, -1),
+        COALESCE(CustomerID, 0),
+        COALESCE(Booking.HaircutID, 0),
+        CASE WHEN Locked = 1 THEN 1 ELSE 0 END,
+        COALESCE(Haircut.Price, 0)
+    FROM Booking
+    LEFT JOIN Haircut ON Booking.HaircutID = Haircut.HaircutID
+    WHERE BookingID > ? AND BookingID < ?
+    ORDER BY BookingID
+'''
+
+
+def read_snapshot(path=SNAPSHOT_PATH):
+    if np is None:
+        raise ImportError("The booking snapshot needs numpy installed")
+    dtype = np.dtype(SNAPSHOT_FIELDS)
+    try:
+        size = os.path.getsize(path)
+    except FileNotFoundError:
+        return np.zeros(0, dtype=dtype)
+    if size < dtype.itemsize:
+        return np.zeros(0, dtype=dtype)
+    # a torn final record from an interrupted append is ignored, the next export rewrites it
+    return np.memmap(path, dtype=dtype, mode="r", shape=(size // dtype.itemsize,))
+
+
+def snapshot_records(rows):
+    return np.array(rows, dtype=[(name, "O") for name, _ in SNAPSHOT_FIELDS]).astype(np.dtype(SNAPSHOT_FIELDS))
+
+
+def export_snapshot(connection, path=SNAPSHOT_PATH):
+    # appends bookings newer than the last exported BookingID and returns how many were written.
+    # Rows stop at the first live hold, which may still be confirmed or expire; a deleted
+    # booking shows up as a count mismatch below the high-water mark, or as a changed last
+    # record if its BookingID was handed out again, and either forces a rewrite
+    dtype = np.dtype(SNAPSHOT_FIELDS)
+    existing = read_snapshot(path)
+    last_id = int(existing["booking_id"][-1]) if len(existing) else 0
+    last_record = existing[-1:].tobytes()
+    exported = len(existing)
+    del existing
+
+    with connection:
+        connection.execute("BEGIN")  # one read snapshot for the check and the rows
+        if last_id and (connection.execute("SELECT COUNT(*) FROM Booking WHERE BookingID <= ?",
+                                           (last_id,)).fetchone()[0] != exported
+                        or snapshot_records(connection.execute(SNAPSHOT_ROWS_SQL, (last_id - 1, last_id + 1))
+                                            .fetchall()).tobytes() != last_record):
+            last_id = exported = 0
+        first_hold = connection.execute(
+            "SELECT MIN(BookingID) FROM Booking WHERE BookingID > ? AND Locked = 0 AND ExpiryTime IS NOT NULL",
+            (last_id,)
+        ).fetchone()[0]
+        rows = connection.execute(SNAPSHOT_ROWS_SQL, (last_id, first_hold or 2 ** 63 - 1)).fetchall()
+
+    if exported == 0 and os.path.exists(path):
+        os.remove(path)
+    if not rows:
+        return 0
+    records = snapshot_records(rows)
+    with open(path, "r+b" if os.path.exists(path) else "wb") as snapshot:
+        snapshot.seek(exported * dtype.itemsize)
+        snapshot.write(records.tobytes())
+        snapshot.truncate()
+        snapshot.flush()
+        os.fsync(snapshot.fileno())
+    return len(records)
+
+
+def delete_expired_bookings(cursor):
+    cursor.execute('''
+        DELETE FROM Booking 
+        WHERE Locked = 0 AND ExpiryTime <= datetime('now', 'localtime')
+    ''')
+    return cursor.rowcount
+
+
+class Reservation(namedtuple("Reservation", ["booking_id", "conflict"])):
+    __slots__ = ()
+
+    # conflict is None on success, "taken" when another booking overlaps, "closed" outside opening hours
+    @property
+    def reserved(self):
+        return self.conflict is None
+
+
+BOOKING_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        BookingID INTEGER PRIMARY KEY AUTOINCREMENT,
+        Date TEXT,
+        Time TEXT,
+        CustomerID INTEGER,
+        HaircutID INTEGER,
+        Locked BOOLEAN DEFAULT 0,
+        Duration TEXT,
+        ExpiryTime TEXT,
+        ChairID INTEGER NOT NULL DEFAULT 1,
+        FOREIGN KEY (CustomerID) REFERENCES Customer(CustomerID),
+        FOREIGN KEY (HaircutID) REFERENCES Haircut(HaircutID),
+        FOREIGN KEY (ChairID) REFERENCES Chair(ChairID)
+    )
+'''
+
+CHAIR_TABLE_SQL = '''CREATE TABLE IF NOT EXISTS Chair (
+    ChairID INTEGER PRIMARY KEY AUTOINCREMENT,
+    Chair_Name TEXT,
+    StaffID INTEGER,
+    Active BOOLEAN DEFAULT 1,
+    FOREIGN KEY (StaffID) REFERENCES Staff(StaffID))'''
+
+# analytics read these instead of scanning Booking; triggers keep them in step with every write
+ROLLUP_TABLES_SQL = [
+    '''CREATE TABLE IF NOT EXISTS BookingRollup (
+        Date TEXT NOT NULL,
+        Hour TEXT NOT NULL,
+        HaircutID INTEGER NOT NULL,
+        Bookings INTEGER NOT NULL DEFAULT 0,
+        LockedBookings INTEGER NOT NULL DEFAULT 0,
+        Revenue REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (Date, Hour, HaircutID)) WITHOUT ROWID''',
+    '''CREATE TABLE IF NOT EXISTS CustomerRollup (
+        CustomerID INTEGER NOT NULL,
+        HaircutID INTEGER NOT NULL,
+        Visits INTEGER NOT NULL DEFAULT 0,
+        LastVisit TEXT,
+        PRIMARY KEY (CustomerID, HaircutID)) WITHOUT ROWID''',
+]
+
+# {row} is NEW or OLD; missing keys are stored as ''/0 because rollup keys can't be NULL
+ROLLUP_KEY_SQL = "COALESCE({row}.Date, ''), COALESCE(strftime('%H:00', {row}.Time), ''), COALESCE({row}.HaircutID, 0)"
+ROLLUP_LOCKED_SQL = "CASE WHEN {row}.Locked = 1 THEN 1 ELSE 0 END"
+ROLLUP_PRICE_SQL = "COALESCE((SELECT Price FROM Haircut WHERE HaircutID = {row}.HaircutID), 0)"
+
+ROLLUP_ADD_SQL = f"""
+    INSERT INTO BookingRollup (Date, Hour, HaircutID, Bookings, LockedBookings, Revenue)
+    SELECT {ROLLUP_KEY_SQL}, 1, {ROLLUP_LOCKED_SQL}, {ROLLUP_PRICE_SQL} WHERE true
+    ON CONFLICT (Date, Hour, HaircutID) DO UPDATE SET
+        Bookings = Bookings + 1,
+        LockedBookings = LockedBookings + excluded.LockedBookings,
+        Revenue = Revenue + excluded.Revenue;
+    INSERT INTO CustomerRollup (CustomerID, HaircutID, Visits, LastVisit)
+    SELECT {{row}}.CustomerID, COALESCE({{row}}.HaircutID, 0), 1, {{row}}.Date WHERE {{row}}.CustomerID IS NOT NULL
+    ON CONFLICT (CustomerID, HaircutID) DO UPDATE SET
+        Visits = Visits + 1,
+        LastVisit = max(COALESCE(LastVisit, ''), COALESCE(excluded.LastVisit, ''));
+"""
+
+ROLLUP_REMOVE_SQL = f"""
+    UPDATE BookingRollup SET
+        Bookings = Bookings - 1,
+        LockedBookings = LockedBookings - {ROLLUP_LOCKED_SQL},
+        Revenue = Revenue - {ROLLUP_PRICE_SQL}
+    WHERE (Date, Hour, HaircutID) = ({ROLLUP_KEY_SQL});
+    DELETE FROM BookingRollup WHERE Bookings <= 0;
+    UPDATE CustomerRollup SET
+        Visits = Visits - 1,
+        LastVisit = (SELECT MAX(Date) FROM Booking
+                     WHERE CustomerID = {{row}}.CustomerID AND COALESCE(HaircutID, 0) = CustomerRollup.HaircutID)
+    WHERE CustomerID = {{row}}.CustomerID AND HaircutID = COALESCE({{row}}.HaircutID, 0);
+    DELETE FROM CustomerRollup WHERE Visits <= 0;
+"""
+
+ROLLUP_TRIGGERS_SQL = [
+    f"""CREATE TRIGGER IF NOT EXISTS booking_rollup_insert AFTER INSERT ON Booking BEGIN
+        {ROLLUP_ADD_SQL.format(row="NEW")}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS booking_rollup_delete AFTER DELETE ON Booking BEGIN
+        {ROLLUP_REMOVE_SQL.format(row="OLD")}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS booking_rollup_update
+    AFTER UPDATE OF Date, Time, CustomerID, HaircutID, Locked ON Booking BEGIN
+        {ROLLUP_REMOVE_SQL.format(row="OLD")}
+        {ROLLUP_ADD_SQL.format(row="NEW")}
+    END""",
+]
+
+# revenue follows the haircut's current price, as the old JOIN-based queries did, so a price change
+# re-prices that haircut's rollup rows and later booking deletes subtract the same price again
+ROLLUP_PRICE_TRIGGERS_SQL = [
+    f"""CREATE TRIGGER IF NOT EXISTS haircut_rollup_{name} AFTER {event} ON Haircut BEGIN
+        UPDATE BookingRollup SET Revenue = Bookings * {ROLLUP_PRICE_SQL.format(row=row)}
+        WHERE HaircutID = {row}.HaircutID;
+    END"""
+    for name, event, row in (("insert", "INSERT", "NEW"), ("price", "UPDATE OF Price", "NEW"), ("delete", "DELETE", "OLD"))
+]
+
+# these read BookingRollup/CustomerRollup, so the cost follows the days shown, not total bookings
+PEAK_HOURS_SQL = '''
+    SELECT 
+        Hour,
+        SUM(LockedBookings) AS Bookings
+    FROM BookingRollup
+    WHERE Date >= date('now', '-' || ? || ' DAYS')
+    GROUP BY Hour
+    HAVING Bookings > 0
+    ORDER BY Bookings DESC, Hour
+'''
+
+REVENUE_BREAKDOWN_SQL = '''
+    SELECT 
+        strftime('%Y-%m', Date) AS Period,
+        Haircut.Haircut_Name,
+        SUM(BookingRollup.Revenue) AS Revenue,
+        SUM(BookingRollup.Bookings) AS Bookings
+    FROM BookingRollup
+    JOIN Haircut ON BookingRollup.HaircutID = Haircut.HaircutID
+    WHERE Date >= date('now', '-' || ? || ' DAYS')
+    GROUP BY Period, Haircut.HaircutID
+    ORDER BY Period DESC, Revenue DESC
+'''
+
+POPULAR_HAIRCUTS_SQL = '''
+    SELECT 
+        Haircut.Haircut_Name,
+        SUM(BookingRollup.Bookings) AS Bookings
+    FROM BookingRollup
+    JOIN Haircut ON BookingRollup.HaircutID = Haircut.HaircutID
+    WHERE BookingRollup.Date >= date('now', '-' || ? || ' DAYS')
+    GROUP BY Haircut.HaircutID
+    ORDER BY Bookings DESC
+'''
+
+LOYAL_CUSTOMERS_SQL = '''
+    SELECT 
+        Customer.FirstName || ' ' || Customer.Surname AS Customer,
+        SUM(CustomerRollup.Visits) AS Visits,
+        GROUP_CONCAT(DISTINCT Haircut.Haircut_Name) AS Styles,
+        MAX(CustomerRollup.LastVisit) AS LastVisit
+    FROM CustomerRollup
+    JOIN Customer ON CustomerRollup.CustomerID = Customer.CustomerID
+    JOIN Haircut ON CustomerRollup.HaircutID = Haircut.HaircutID
+    GROUP BY CustomerRollup.CustomerID
+    HAVING Visits >= ?
+    ORDER BY Visits DESC
+'''
+
+ANALYTICS_VERSION_SQL = "SELECT Version FROM DataVersion WHERE Name = 'analytics'"
+
+# one row per booking, shaped for NumpyAnalytics: unparseable dates/times and missing IDs become NULL/0
+ANALYTICS_COLUMNS_SQL = '''
+    SELECT
+        CASE WHEN Date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]' THEN Date END,
+        COALESCE(CASE WHEN Time GLOB '[0-9][0-9]:*' THEN CAST(substr(Time, 1, 2) AS INTEGER) END, -1),
+        COALESCE(CustomerID, 0),
+        COALESCE(HaircutID, 0),
+        CASE WHEN Locked = 1 THEN 1 ELSE 0 END
+    FROM Booking
+    ORDER BY Date IS NULL, Date
+'''
+
+# bumped by any write that can change the dashboard, so cached analytics know when they are stale
+DATA_VERSION_TRIGGERS_SQL = [
+    f"""CREATE TRIGGER IF NOT EXISTS {table.lower()}_version_{event.lower()} AFTER {event} ON {table} BEGIN
+        UPDATE DataVersion SET Version = Version + 1 WHERE Name = 'analytics';
+    END"""
+    for table in ("Booking", "Customer", "Haircut") for event in ("INSERT", "UPDATE", "DELETE")
+]
+
+# bumped by any write that can change which slots are free, so every terminal's AvailabilityEngine
+# notices bookings made or removed by another process
+AVAILABILITY_VERSION_SQL = "SELECT Version FROM DataVersion WHERE Name = 'availability'"
+AVAILABILITY_VERSION_TRIGGERS_SQL = [
+    f"""CREATE TRIGGER IF NOT EXISTS {table.lower()}_availability_{event.lower()} AFTER {event} ON {table} BEGIN
+        UPDATE DataVersion SET Version = Version + 1 WHERE Name = 'availability';
+    END"""
+    for table, event in (("Booking", "INSERT"), ("Booking", "UPDATE"), ("Booking", "DELETE"), ("Haircut", "UPDATE"),
+                         ("Chair", "INSERT"), ("Chair", "UPDATE"), ("Chair", "DELETE"))
+]
+
+# keyset orderings for the booking browser: the columns form a unique key, the indexes give
+# each column's position in a SELECT * row so the last row of a page becomes the next cursor
+BOOKING_ORDERS = {
+    "date": (["Date", "Time", "BookingID"], [1, 2, 0]),
+    "id": (["BookingID"], [0]),
+}
+
+# primary keys of the tables the database window pages through
+TABLE_KEYS = {"Customer": "CustomerID", "Haircut": "HaircutID", "Staff": "StaffID"}
+
+START_MINUTES_SQL = "(CAST(substr(Time, 1, 2) AS INTEGER) * 60 + CAST(substr(Time, 4, 2) AS INTEGER))"
+DURATION_SQL = f"""COALESCE(
+    NULLIF(CAST(Duration AS INTEGER), 0),
+    NULLIF((SELECT CAST(Estimated_Time AS INTEGER) FROM Haircut WHERE Haircut.HaircutID = Booking.HaircutID), 0),
+    {SLOT_MINUTES})"""
+
+# one statement: the UNIQUE(Date, Time, ChairID) index catches same-start races, NOT EXISTS catches
+# overlaps, and an expired unpaid hold on the same slot is taken over instead of reported as a conflict
+RESERVE_SLOT_SQL = f"""
+    INSERT INTO Booking (Date, Time, CustomerID, HaircutID, Locked, Duration, ExpiryTime, ChairID)
+    SELECT :date, :time, :customer, :haircut, :locked, :duration, :expiry, :chair
+    WHERE NOT EXISTS (
+        SELECT 1 FROM Booking
+        WHERE Date = :date AND ChairID = :chair AND Time != :time
+        AND (Locked = 1 OR ExpiryTime > :now)
+        AND {START_MINUTES_SQL} < :end
+        AND {START_MINUTES_SQL} + {DURATION_SQL} > :start
+    )
+    ON CONFLICT(Date, Time, ChairID) DO UPDATE SET
+        CustomerID = excluded.CustomerID,
+        HaircutID = excluded.HaircutID,
+        Locked = excluded.Locked,
+        Duration = excluded.Duration,
+        ExpiryTime = excluded.ExpiryTime
+    WHERE Booking.Locked = 0 AND Booking.ExpiryTime <= :now
+    RETURNING BookingID
+"""
+
+
+class BookingError(Exception):
+    pass
+
+
+class ValidationError(BookingError, ValueError):
+    pass
+
+
+class NotFoundError(BookingError):
+    pass
+
+
+class SlotUnavailableError(BookingError):
+    pass
+
+
+class AuthenticationError(BookingError):
+    pass
+
+
+class RateLimitError(AuthenticationError):
+    pass
+
+
+class ServiceBusyError(BookingError):
+    pass
+
+
+class ScryptHasher:
+    algorithm = "scrypt"
+
+    def __init__(self, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P):
+        self.n = n
+        self.r = r
+        self.p = p
+
+    @classmethod
+    def from_params(cls, params):
+        n, r, p = params
+        return cls(int(n), int(r), int(p))
+
+    def params(self):
+        return [self.n, self.r, self.p]
+
+    def derive(self, password, salt):
+        # scrypt needs 128 * n * r bytes, which passes OpenSSL's 32MB default from n=2**15
+        return hashlib.scrypt(password.encode(), salt=salt.encode(), n=self.n, r=self.r, p=self.p,
+                              maxmem=256 * self.n * self.r + 1024 * 1024).hex()
+
+    def stronger(self):
+        return type(self)(self.n * 2, self.r, self.p)
+
+
+class Pbkdf2Hasher:
+    algorithm = "pbkdf2_sha256"
+
+    def __init__(self, iterations=PBKDF2_ITERATIONS):
+        self.iterations = iterations
+
+    @classmethod
+    def from_params(cls, params):
+        iterations, = params
+        return cls(int(iterations))
+
+    def params(self):
+        return [self.iterations]
+
+    def derive(self, password, salt):
+        return hashlib.pbkdf2_hmac("sha256", password.encode(), salt.encode(), self.iterations).hex()
+
+    def stronger(self):
+        return type(self)(self.iterations * 2)
+
+
+HASHERS = {hasher.algorithm: hasher for hasher in (ScryptHasher, Pbkdf2Hasher)}
+
+
+def encode_hash(hasher, password, salt):
+    # stored as "algorithm$param$...$digest" so the cost can change without breaking old accounts
+    return "$".join([hasher.algorithm, *map(str, hasher.params()), hasher.derive(password, salt)])
+
+
+def hasher_for(stored_hash):
+    algorithm, *fields = stored_hash.split("$")
+    if algorithm not in HASHERS:
+        return None  # legacy hex digest from before the key-derivation hashers
+    return HASHERS[algorithm].from_params(fields[:-1])
+
+
+def default_hasher():
+    return ScryptHasher() if HASH_ALGORITHM == "scrypt" else Pbkdf2Hasher()
+
+
+def time_hasher(hasher, rounds=3):
+    best = None
+    for i in range(rounds):
+        started = perf_counter()
+        hasher.derive("calibration password", "calibration salt")
+        elapsed = (perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def calibrate_hasher(target_ms=HASH_TARGET_MS, algorithm=HASH_ALGORITHM):
+    # doubles the cost until one hash takes at least target_ms on this machine
+    hasher = ScryptHasher(2 ** 10) if algorithm == "scrypt" else Pbkdf2Hasher(10000)
+    elapsed = time_hasher(hasher)
+    while elapsed < target_ms:
+        hasher = hasher.stronger()
+        elapsed = time_hasher(hasher)
+    return hasher, elapsed
+
+
+def run_calibration(target_ms=HASH_TARGET_MS):
+    for algorithm in HASHERS:
+        hasher, elapsed = calibrate_hasher(target_ms, algorithm)
+        if algorithm == "scrypt":
+            print(f"scrypt: SCRYPT_N = 2 ** {hasher.n.bit_length() - 1}  ({elapsed:.0f} ms per login)")
+        else:
+            print(f"pbkdf2_sha256: PBKDF2_ITERATIONS = {hasher.iterations}  ({elapsed:.0f} ms per login)")
+
+
+class TokenBucket:
+    def __init__(self, capacity=LOGIN_BURST, refill_seconds=LOGIN_REFILL_SECONDS, max_keys=10000):
+        self.capacity = capacity
+        self.refill_seconds = refill_seconds
+        self.max_keys = max_keys
+        self.buckets = {}  # key -> (tokens, time of last refill)
+        self.lock = threading.Lock()
+
+    def take(self, key):
+        # returns 0 when a token was taken, otherwise the seconds until one is available
+        now = monotonic()
+        with self.lock:
+            if len(self.buckets) >= self.max_keys:
+                self.prune(now)
+            tokens, updated = self.buckets.get(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated) / self.refill_seconds)
+            if tokens >= 1:
+                self.buckets[key] = (tokens - 1, now)
+                return 0
+            self.buckets[key] = (tokens, now)
+            return (1 - tokens) * self.refill_seconds
+
+    def prune(self, now):
+        # a bucket that has refilled to capacity is the same as no bucket
+        for key, (tokens, updated) in list(self.buckets.items()):
+            if tokens + (now - updated) / self.refill_seconds >= self.capacity:
+                del self.buckets[key]
+
+
+class CredentialCache:
+    def __init__(self, ttl=CREDENTIAL_TTL):
+        self.ttl = ttl
+        self.entries = {}  # key -> (row, expiry)
+        self.lock = threading.Lock()
+
+    def get(self, key, load):
+        now = monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[1] > now:
+                return entry[0]
+        row = load()
+        if row is None:
+            return None  # misses aren't cached, the row may be a registration still being committed
+        with self.lock:
+            self.entries[key] = (row, now + self.ttl)
+            if len(self.entries) > 1000:
+                self.evict(now)
+        return row
+
+    def evict(self, now):
+        for key, (row, expiry) in list(self.entries.items()):
+            if expiry <= now:
+                del self.entries[key]
+
+    def discard(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def discard_if(self, matches):
+        with self.lock:
+            for key, (row, expiry) in list(self.entries.items()):
+                if matches(key, row):
+                    del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class SessionManager:
+    # tokens are "<id>.<signature>"; the table maps id -> [subject, role, expiry] and each
+    # successful check pushes the expiry back by ttl
+    def __init__(self, ttl=SESSION_TTL, secret=None):
+        self.ttl = ttl
+        self.secret = secret or secrets.token_bytes(32)
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def sign(self, session_id):
+        return hmac.new(self.secret, session_id.encode(), hashlib.sha256).hexdigest()[:32]
+
+    def issue(self, subject, role):
+        session_id = secrets.token_urlsafe(12)
+        with self.lock:
+            if len(self.sessions) > 1000:
+                now = monotonic()
+                for key, session in list(self.sessions.items()):
+                    if session[2] <= now:
+                        del self.sessions[key]
+            self.sessions[session_id] = [subject, role, monotonic() + self.ttl]
+        return f"{session_id}.{self.sign(session_id)}"
+
+    def validate(self, token, role=None):
+        # returns the subject the token was issued for, or None
+        if not token:
+            return None
+        session_id, _, signature = token.partition(".")
+        if not hmac.compare_digest(signature, self.sign(session_id)):
+            return None
+        now = monotonic()
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                return None
+            if session[2] <= now:
+                del self.sessions[session_id]
+                return None
+            if role is not None and session[1] != role:
+                return None
+            session[2] = now + self.ttl
+            return session[0]
+
+    def revoke(self, token):
+        if token:
+            with self.lock:
+                self.sessions.pop(token.partition(".")[0], None)
+
+
+def poll_future(widget, future, callback, interval=50):
+    # keeps the Tk main loop running while a worker finishes, then calls back on the Tk thread
+    if future.done():
+        callback(future)
+    else:
+        widget.after(interval, poll_future, widget, future, callback, interval)
+
 
 class AuthManager:
-    def __init__(self, db):
-        self.email = []
-        self.password = []
+    def __init__(self, db, hasher=None):
         self.db = db
+        self.hasher = hasher or default_hasher()
+        # scrypt and pbkdf2_hmac release the GIL, so hashing on threads runs in parallel
+        self.workers = ThreadPoolExecutor(max_workers=LOGIN_WORKERS, thread_name_prefix="login")
+        self.login_attempts = TokenBucket()
+        self.sessions = SessionManager()
 
-    def valid_email(self, email):
-        return email in self.email
-
-    def valid_password(self, password):
-        return password in self.password
+    def hash_password(self, password, salt=""):
+        return encode_hash(self.hasher, password, salt)
 
-    def hash_password(self, password, salt="", rounds=10):
+    def legacy_hash_password(self, password, salt="", rounds=10):
         new_password = password + salt
         hashed_value = 2166136261
         for i in range(rounds):
@@ -37,41 +1125,512 @@ class AuthManager:
                 hashed_value &= 0xFFFFFFFF
         return format(hashed_value, '08x') # returns in hex
 
-    def generate_salt(self, length=8):
+    def generate_salt(self, length=16):
         characters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789'
         salt = ""
         for i in range(length):
-            character = random.choice(characters)
+            character = secrets.choice(characters)
             salt = salt + character
         return salt
 
+    def verify_password(self, password, salt, stored_hash):
+        if not stored_hash:
+            return False
+        hasher = hasher_for(stored_hash)
+        if hasher is None:
+            hashed_password = self.legacy_hash_password(password, salt)
+        else:
+            hashed_password = encode_hash(hasher, password, salt)
+        return hmac.compare_digest(hashed_password, stored_hash)
+
+    def needs_rehash(self, stored_hash):
+        hasher = hasher_for(stored_hash)
+        return (hasher is None or hasher.algorithm != self.hasher.algorithm
+                or hasher.params() != self.hasher.params())
+
     def login_check(self, email, password):
-        customer = self.db.fetch_customer_email(email)
+        customer = self.db.fetch_credentials(email)
         if customer:
-            hash = customer[4]
-            salt = customer[5]
-            hashed_password = self.hash_password(password, salt)
-            return hashed_password == hash
+            hash = customer[1]
+            salt = customer[2]
+            if not self.verify_password(password, salt, hash):
+                return False
+            if self.needs_rehash(hash):
+                # the plain password is only available here, so old hashes are upgraded on login
+                new_salt = self.generate_salt()
+                self.db.update_password(customer[0], self.hash_password(password, new_salt), new_salt)
+            return True
         return False
 
-    def staff_check(self, Staff_Number):
+    def check_rate(self, email):
+        wait = self.login_attempts.take(str(email or "").strip().lower())
+        if wait:
+            raise RateLimitError(f"Too many login attempts, please try again in {wait:.0f} seconds.")
+
+    def submit_login(self, email, password):
+        try:
+            self.check_rate(email)
+        except RateLimitError as error:
+            future = Future()
+            future.set_exception(error)
+            return future
+        return self.workers.submit(self.start_session, email, password)
+
+    def start_session(self, email, password):
+        # one password check, then the returned token stands in for it until it goes idle.
+        # This runs on the login workers, which must hand their reader back to the pool
+        try:
+            if not self.login_check(email, password):
+                return None
+            return self.sessions.issue(self.db.fetch_credentials(email)[0], "customer")
+        finally:
+            self.db.pool.release_reader()
+
+    def start_staff_session(self, Staff_Number, allow_default=True):
+        if not self.staff_check(Staff_Number, allow_default):
+            return None
+        return self.sessions.issue(Staff_Number, "staff")
+
+    def is_staff(self, token):
+        return self.sessions.validate(token, "staff") is not None
+
+    def staff_check(self, Staff_Number, allow_default=True):
+        # the seeded "admin" staff number only works at the desk, never over the network
         if Staff_Number == "admin":
-            return True
-        staff = self.db.fetch_staff_number(Staff_Number)
+            return allow_default
+        staff = self.db.fetch_staff_credentials(Staff_Number)
         if staff:
             return True
         else:
             return False
 
 
+class AnalyticsWorker(threading.Thread):
+    # computes dashboard panels on its own read-only connection and posts (generation, panel, rows)
+    # to results as each one finishes; submitting again abandons whatever is still in progress.
+    # With the numpy backend the panels come from the DatabaseManager getters instead
+    panels = [
+        ("peak_hours", PEAK_HOURS_SQL, "days", "get_peak_hours"),
+        ("revenue", REVENUE_BREAKDOWN_SQL, "days", "get_revenue_breakdown"),
+        ("popular_haircuts", POPULAR_HAIRCUTS_SQL, "days", "get_popular_haircuts"),
+        ("loyal_customers", LOYAL_CUSTOMERS_SQL, "min_visits", "get_loyal_customers"),
+    ]
+
+    def __init__(self, db):
+        super().__init__(daemon=True)
+        self.db = db
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self.generation = 0
+        self.running_query = False
+        self.lock = threading.Lock()
+        self.connection = None
+
+    def submit(self, days, min_visits=3):
+        with self.lock:
+            self.generation += 1
+            if self.running_query:
+                self.connection.interrupt()
+        self.requests.put((self.generation, days, min_visits))
+        return self.generation
+
+    def stop(self):
+        self.requests.put((None, None, None))
+
+    def run(self):
+        self.connection = connect_database(self.db.pool.path, readonly=True)
+        while True:
+            generation, days, min_visits = self.requests.get()
+            if generation is None:
+                break
+            try:
+                self.compute(generation, {"days": days, "min_visits": min_visits})
+            except sqlite3.Error as error:
+                if generation == self.generation:
+                    self.results.put((generation, "error", error))
+        self.connection.close()
+
+    def fetch(self, generation, sql, params=()):
+        # None means a newer request arrived, either before the query started or while it ran
+        with self.lock:
+            if generation != self.generation:
+                return None
+            self.running_query = True
+        try:
+            return self.connection.execute(sql, params).fetchall()
+        except sqlite3.OperationalError:
+            if generation != self.generation:
+                return None
+            raise
+        finally:
+            with self.lock:
+                self.running_query = False
+
+    def dispatch(self, generation, getter, value):
+        # numpy group-bys can't be interrupted, so a superseded request is only dropped between panels
+        if generation != self.generation:
+            return None
+        try:
+            return getattr(self.db, getter)(value)
+        finally:
+            self.db.pool.release_reader()  # this thread lives as long as the app
+
+    def compute(self, generation, params):
+        version = self.fetch(generation, ANALYTICS_VERSION_SQL)
+        if version is None:
+            return
+        key = self.db.analytics_key(params["days"], params["min_visits"], version[0][0])
+        snapshot = self.db.analytics_cache.get(key)
+        if snapshot is not None:
+            for panel, rows in snapshot.items():
+                self.results.put((generation, panel, rows))
+            return
+
+        snapshot = {}
+        for panel, sql, param, getter in self.panels:
+            if self.db.use_numpy():
+                rows = self.dispatch(generation, getter, params[param])
+            else:
+                rows = self.fetch(generation, sql, (params[param],))
+            if rows is None:
+                return
+            snapshot[panel] = rows
+            self.results.put((generation, panel, rows))
+        self.db.store_analytics(key, snapshot)
+
+
+class NumpyAnalytics:
+    # loads the booking columns into arrays once per data version and answers reports with
+    # bincount/searchsorted group-bys; dates are sorted so a day window is one searchsorted slice
+    def __init__(self, db, snapshot=None):
+        # with a snapshot path the bookings come from the exported file instead of the live table
+        if np is None:
+            raise ImportError("NumpyAnalytics needs numpy installed")
+        self.db = db
+        self.snapshot = snapshot
+        self.version = None
+        self.data = None
+
+    def load(self):
+        if self.snapshot:
+            version = os.stat(self.snapshot).st_mtime_ns if os.path.exists(self.snapshot) else None
+        else:
+            version = self.db.analytics_version()
+        if self.data is not None and version == self.version:
+            return self.data
+
+        data = self.load_snapshot() if self.snapshot else self.load_table()
+        data["dated"] = int(np.count_nonzero(~np.isnat(data["date"])))  # NULL dates sort last
+
+        haircut_rows = self.db.query("SELECT HaircutID, Haircut_Name, Price FROM Haircut ORDER BY HaircutID")
+        size = max([row[0] for row in haircut_rows] + [int(data["haircut"].max(initial=0))]) + 1
+        data["haircut_names"] = {row[0]: row[1] for row in haircut_rows}
+        data["haircut_exists"] = np.zeros(size, dtype=bool)
+        data["price"] = np.zeros(size)
+        if haircut_rows:
+            ids = np.array([row[0] for row in haircut_rows], dtype=np.int32)
+            data["haircut_exists"][ids] = True
+            data["price"][ids] = [row[2] or 0 for row in haircut_rows]
+        if "booking_price" not in data:
+            data["booking_price"] = data["price"][data["haircut"]]
+
+        customer_rows = self.db.query("SELECT CustomerID, FirstName || ' ' || Surname FROM Customer")
+        size = max([row[0] for row in customer_rows] + [int(data["customer"].max(initial=0))]) + 1
+        data["customer_names"] = {row[0]: row[1] for row in customer_rows}
+        data["customer_exists"] = np.zeros(size, dtype=bool)
+        if customer_rows:
+            data["customer_exists"][[row[0] for row in customer_rows]] = True
+
+        self.data, self.version = data, version
+        return data
+
+    def load_table(self):
+        rows = self.db.query(ANALYTICS_COLUMNS_SQL)
+        dates, hours, customers, haircuts, locked = zip(*rows) if rows else ([], [], [], [], [])
+        return {
+            "date": np.array(dates, dtype="datetime64[D]"),
+            "hour": np.array(hours, dtype=np.int32),
+            "customer": np.array(customers, dtype=np.int32),
+            "haircut": np.array(haircuts, dtype=np.int32),
+            "locked": np.array(locked, dtype=bool),
+        }
+
+    def load_snapshot(self):
+        # records are in BookingID order; sorting by date copies the columns out of the mapping
+        records = read_snapshot(self.snapshot)
+        order = np.argsort(records["date"], kind="stable")
+        return {
+            "date": records["date"][order],
+            "hour": records["hour"][order],
+            "customer": records["customer"][order],
+            "haircut": records["haircut"][order],
+            "locked": records["locked"][order],
+            "booking_price": records["price"][order],  # the price when the booking was exported
+        }
+
+    def window(self, data, days):
+        # same cut-off as the SQL reports, which compare against date('now') in UTC
+        start = np.datetime64(self.db.query_one("SELECT date('now', '-' || ? || ' DAYS')", (days,))[0])
+        return slice(int(np.searchsorted(data["date"][:data["dated"]], start)), data["dated"]), start
+
+    def peak_hours(self, days):
+        data = self.load()
+        rows, start = self.window(data, days)
+        hours = data["hour"][rows][data["locked"][rows] & (data["hour"][rows] >= 0)]
+        counts = np.bincount(hours, minlength=24)
+        order = np.lexsort((np.arange(len(counts)), -counts))
+        return [(f"{hour:02d}:00", int(counts[hour])) for hour in order if counts[hour]]
+
+    def revenue_breakdown(self, days):
+        data = self.load()
+        rows, start = self.window(data, days)
+        haircuts = data["haircut"][rows]
+        keep = data["haircut_exists"][haircuts]
+        haircuts = haircuts[keep]
+        months = data["date"][rows][keep].astype("datetime64[M]").astype(np.int64)
+
+        keys, groups = np.unique(months * len(data["price"]) + haircuts, return_inverse=True)
+        counts = np.bincount(groups, minlength=len(keys))
+        revenue = np.bincount(groups, weights=data["booking_price"][rows][keep], minlength=len(keys))
+        group_months, group_haircuts = np.divmod(keys, len(data["price"]))
+        order = np.lexsort((-revenue, -group_months))
+        return [(str(np.datetime64(int(group_months[i]), "M")), data["haircut_names"][int(group_haircuts[i])],
+                 float(revenue[i]), int(counts[i])) for i in order]
+
+    def popular_haircuts(self, days):
+        data = self.load()
+        rows, start = self.window(data, days)
+        counts = np.bincount(data["haircut"][rows], minlength=len(data["price"]))
+        counts[~data["haircut_exists"]] = 0
+        order = np.lexsort((np.arange(len(counts)), -counts))
+        return [(data["haircut_names"][int(haircut)], int(counts[haircut])) for haircut in order if counts[haircut]]
+
+    def loyal_customers(self, min_visits):
+        data = self.load()
+        customers, haircuts, dates = data["customer"], data["haircut"], data["date"]
+        keep = data["customer_exists"][customers] & data["haircut_exists"][haircuts]
+        customers, haircuts, dates = customers[keep], haircuts[keep], dates[keep]
+
+        visits = np.bincount(customers, minlength=len(data["customer_exists"]))
+        last_visit = np.full(len(visits), np.iinfo(np.int64).min)
+        np.maximum.at(last_visit, customers, np.where(np.isnat(dates), np.iinfo(np.int64).min,
+                                                       dates.astype(np.int64)))
+        styles = np.unique(customers.astype(np.int64) * len(data["price"]) + haircuts)
+        style_customers, style_haircuts = np.divmod(styles, len(data["price"]))
+
+        loyal = np.flatnonzero(visits >= max(min_visits, 1))
+        loyal = loyal[np.argsort(-visits[loyal], kind="stable")]
+        bounds = np.searchsorted(style_customers, loyal), np.searchsorted(style_customers, loyal, side="right")
+        return [(data["customer_names"][int(customer)], int(visits[customer]),
+                 ",".join(data["haircut_names"][int(h)] for h in style_haircuts[first:last]),
+                 None if last_visit[customer] == np.iinfo(np.int64).min
+                 else str(np.datetime64(int(last_visit[customer]), "D")))
+                for customer, first, last in zip(loyal, *bounds)]
+
+    def weekday_hour_heatmap(self, days):
+        # 7 x 24 confirmed bookings, Monday first; 1970-01-01 was a Thursday
+        data = self.load()
+        rows, start = self.window(data, days)
+        keep = data["locked"][rows] & (data["hour"][rows] >= 0) & (data["hour"][rows] < 24)
+        weekdays = (data["date"][rows][keep].astype(np.int64) + 3) % 7
+        return np.bincount(weekdays * 24 + data["hour"][rows][keep], minlength=7 * 24).reshape(7, 24)
+
+    def revenue_trends(self, days, period="M"):
+        # revenue per service per period ("W" or "M"): (periods, services, periods x services matrix)
+        data = self.load()
+        rows, start = self.window(data, days)
+        haircuts = data["haircut"][rows]
+        keep = data["haircut_exists"][haircuts]
+        haircuts = haircuts[keep]
+        periods = data["date"][rows][keep].astype(f"datetime64[{period}]")
+
+        labels, period_index = np.unique(periods, return_inverse=True)
+        services = np.flatnonzero(data["haircut_exists"])
+        service_index = np.searchsorted(services, haircuts)
+        revenue = np.bincount(period_index * len(services) + service_index, weights=data["booking_price"][rows][keep],
+                              minlength=len(labels) * len(services)).reshape(len(labels), len(services))
+        return [str(label) for label in labels], [data["haircut_names"][int(s)] for s in services], revenue
+
+    def moving_average(self, days, window=7):
+        # bookings per day over the window and their trailing mean (shorter at the start)
+        data = self.load()
+        rows, start = self.window(data, days)
+        offsets = (data["date"][rows] - start).astype(np.int64)
+        daily = np.bincount(offsets, minlength=days + 1)[:days + 1]
+        totals = np.cumsum(daily)
+        trailing = totals - np.concatenate([np.zeros(window, dtype=totals.dtype), totals[:-window]])[:len(totals)]
+        average = trailing / np.minimum(np.arange(1, len(daily) + 1), window)
+        return start + np.arange(len(daily)), daily, average
+
+    def retention_cohorts(self, months=12):
+        # customers grouped by the month of their first booking; cell [c, m] is the share of
+        # cohort c that booked again m months later
+        data = self.load()
+        dated = slice(0, data["dated"])
+        customers = data["customer"][dated]
+        keep = customers > 0
+        customers = customers[keep]
+        booked = data["date"][dated][keep].astype("datetime64[M]").astype(np.int64)
+
+        first = np.full(len(data["customer_exists"]), np.iinfo(np.int64).max)
+        np.minimum.at(first, customers, booked)
+        offsets = booked - first[customers]
+        keep = offsets < months
+        active = np.unique(customers[keep].astype(np.int64) * months + offsets[keep])
+        active_customers, active_offsets = np.divmod(active, months)
+
+        cohorts, cohort_index = np.unique(first[active_customers], return_inverse=True)
+        counts = np.bincount(cohort_index * months + active_offsets,
+                             minlength=len(cohorts) * months).reshape(len(cohorts), months)
+        sizes = counts[:, 0]
+        return ([str(np.datetime64(int(cohort), "M")) for cohort in cohorts], sizes,
+                counts / np.maximum(sizes, 1)[:, None])
+
+
+class GroupCommitter(threading.Thread):
+    # keeps one write transaction open and commits it every interval, so a burst of small writes
+    # shares one fsync. Each transaction() block still runs in its own savepoint, so a failed
+    # block only undoes itself. Reader connections see a write once its group commits, so
+    # anything cached from a reader in the meantime is dropped by on_commit
+    def __init__(self, connection, write_lock, interval, on_commit=None):
+        super().__init__(name="group-commit", daemon=True)
+        self.connection = connection
+        self.write_lock = write_lock
+        self.interval = interval
+        self.on_commit = on_commit
+        self.opened = None  # monotonic() when the open group began
+        self.wake = threading.Condition()
+        self.stopped = False
+
+    @contextmanager
+    def unit(self, cursor):
+        # the caller holds write_lock
+        if not self.connection.in_transaction:
+            cursor.execute("BEGIN IMMEDIATE")
+            with self.wake:
+                self.opened = monotonic()
+                self.wake.notify()
+        cursor.execute("SAVEPOINT unit")
+        try:
+            yield cursor
+        except BaseException:
+            cursor.execute("ROLLBACK TO unit")
+            cursor.execute("RELEASE unit")
+            raise
+        cursor.execute("RELEASE unit")
+
+    def flush(self):
+        with self.write_lock:
+            if self.connection.in_transaction:
+                self.connection.commit()
+                if self.on_commit is not None:
+                    self.on_commit()
+            with self.wake:
+                self.opened = None
+
+    def stop(self):
+        with self.wake:
+            self.stopped = True
+            self.wake.notify()
+        self.join()
+
+    def run(self):
+        while True:
+            with self.wake:
+                while not self.stopped and (self.opened is None or monotonic() < self.opened + self.interval):
+                    self.wake.wait(None if self.opened is None else self.opened + self.interval - monotonic())
+                if self.stopped:
+                    break
+            self.flush()
+        self.flush()
+
+
 class DatabaseManager:
-    def __init__(self):
-        self.connection = sqlite3.connect("barberdb.db")
-        self.cursor = self.connection.cursor()
+    def __init__(self, path=DATABASE_PATH):
+        self.pool = ConnectionPool(path)
+        self.connection = self.pool.writer()
+        self.committer = None  # GroupCommitter while group_commit() is on
         self.create_tables()
+        self.availability = AvailabilityEngine(self)
+        self.holds = HoldExpiryIndex()
+        self.credentials = CredentialCache()
+        self.analytics_cache = {}
+        self.numpy_analytics = NumpyAnalytics(self) if np is not None else None
+
+    # every call gets its own cursor, so callers on other threads never share a result set
+    def query(self, sql, params=()):
+        return self.pool.reader().execute(sql, params).fetchall()
+
+    def query_one(self, sql, params=()):
+        return self.pool.reader().execute(sql, params).fetchone()
+
+    def execute(self, sql, params=()):
+        with self.transaction() as cursor:
+            cursor.execute(sql, params)
+        return cursor
+
+    @contextmanager
+    def transaction(self, begin="BEGIN"):
+        with self.pool.write_lock:
+            cursor = self.connection.cursor()
+            if self.committer is not None:
+                with self.committer.unit(cursor):
+                    yield cursor
+                return
+            if self.connection.in_transaction:
+                # nested use joins the caller's transaction, the outermost block commits
+                yield cursor
+                return
+            cursor.execute(begin)
+            try:
+                yield cursor
+            except BaseException:
+                self.connection.rollback()
+                raise
+            self.connection.commit()
+
+    @contextmanager
+    def unit_of_work(self):
+        # groups many insert_*/remove_* calls into one transaction and one commit. Those methods
+        # update the in-memory caches as they go, so a rollback throws the caches away.
+        # Queries inside the block read committed data and will not see its own writes yet
+        try:
+            with self.transaction("BEGIN IMMEDIATE"):
+                yield self
+        except BaseException:
+            self.availability.invalidate()
+            self.credentials.clear()
+            raise
+
+    def group_commit(self, interval_ms=GROUP_COMMIT_MS):
+        # for high-rate writers: commits happen at most every interval_ms instead of per transaction
+        if self.committer is None:
+            self.committer = GroupCommitter(self.connection, self.pool.write_lock, interval_ms / 1000,
+                                            self.forget_cached)
+            self.committer.start()
+
+    def end_group_commit(self):
+        if self.committer is not None:
+            committer, self.committer = self.committer, None
+            committer.stop()
+
+    def flush(self):
+        if self.committer is not None:
+            self.committer.flush()
+
+    def forget_cached(self):
+        # lookups made while a group was open could only see committed rows
+        self.availability.invalidate()
+        self.credentials.clear()
 
     def create_tables(self):
-        self.cursor.execute('''CREATE TABLE IF NOT EXISTS Customer (
+        with self.transaction() as cursor:
+            self.create_table_schema(cursor)
+        self.migrate()
+        self.insert_admin()
+
+    def create_table_schema(self, cursor):
+        cursor.execute('''CREATE TABLE IF NOT EXISTS Customer (
             CustomerID INTEGER PRIMARY KEY AUTOINCREMENT,
             Surname TEXT,
             FirstName TEXT,
@@ -80,280 +1639,1157 @@ class DatabaseManager:
             Salt TEXT,
             Date_Of_Birth TEXT)''')
 
-        self.cursor.execute('''CREATE TABLE IF NOT EXISTS Haircut (
+        cursor.execute('''CREATE TABLE IF NOT EXISTS Haircut (
             HaircutID INTEGER PRIMARY KEY AUTOINCREMENT,
             Haircut_Name TEXT,
             Price REAL,
             Estimated_Time INTEGER)''')
 
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS Booking (
-                BookingID INTEGER PRIMARY KEY,
-                Date TEXT,
-                Time TEXT,
-                CustomerID INTEGER,
-                HaircutID INTEGER,
-                Locked BOOLEAN DEFAULT 0,
-                Duration TEXT,
-                ExpiryTime TEXT,
-                FOREIGN KEY (CustomerID) REFERENCES Customer(CustomerID),
-                FOREIGN KEY (HaircutID) REFERENCES Haircut(HaircutID)
-                UNIQUE(Date, Time) 
-            )
-        ''')
+        cursor.execute(BOOKING_TABLE_SQL.format(table="Booking"))
 
-        self.cursor.execute('''CREATE TABLE IF NOT EXISTS Staff (
+        cursor.execute('''CREATE TABLE IF NOT EXISTS Staff (
             StaffID INTEGER PRIMARY KEY AUTOINCREMENT, 
             Email TEXT,
             Staff_Number TEXT)''')
-        self.insert_admin()
+
+        cursor.execute(CHAIR_TABLE_SQL)
+
+    def migrate(self):
+        # each step runs once; PRAGMA user_version records how many have been applied
+        migrations = [
+            self.migrate_booking_columns,
+            self.migrate_lookup_indexes,
+            self.migrate_unique_email,
+            self.migrate_unique_slot,
+            self.migrate_chairs,
+            self.migrate_rollups,
+            self.migrate_data_version,
+            self.migrate_browse_indexes,
+            self.migrate_availability_version,
+            self.migrate_rollup_prices,
+            self.migrate_booking_autoincrement,
+            self.migrate_drop_date_time_index,
+        ]
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+
+        for number, migration in enumerate(migrations[version:], start=version + 1):
+            with self.transaction() as cursor:
+                migration(cursor)
+                cursor.execute(f"PRAGMA user_version = {number}")
+
+    def migrate_booking_columns(self, cursor):
+        # databases made by the first version of the app have no hold/expiry columns
+        cursor.execute("PRAGMA table_info(Booking)")
+        columns = {row[1] for row in cursor.fetchall()}
+        if "Locked" not in columns:
+            cursor.execute("ALTER TABLE Booking ADD COLUMN Locked BOOLEAN DEFAULT 1")
+        if "Duration" not in columns:
+            cursor.execute("ALTER TABLE Booking ADD COLUMN Duration TEXT")
+        if "ExpiryTime" not in columns:
+            cursor.execute("ALTER TABLE Booking ADD COLUMN ExpiryTime TEXT")
+
+    def migrate_lookup_indexes(self, cursor):
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_staff_number ON Staff(Staff_Number)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_booking_customer ON Booking(CustomerID)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_booking_expiry ON Booking(Locked, ExpiryTime)")
+
+    def migrate_unique_email(self, cursor):
+        try:
+            cursor.execute("SAVEPOINT unique_email")
+            cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_customer_email ON Customer(Email)")
+            cursor.execute("RELEASE unique_email")
+        except sqlite3.IntegrityError:
+            # existing duplicate emails have to be cleaned up by hand, keep logins fast meanwhile
+            cursor.execute("ROLLBACK TO unique_email")
+            cursor.execute("RELEASE unique_email")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_customer_email ON Customer(Email)")
+            print("Duplicate customer emails found, Customer.Email is indexed but not unique")
+
+    def migrate_unique_slot(self, cursor):
+        # older databases were created without UNIQUE(Date, Time), which reserve_slot relies on
+        cursor.execute("PRAGMA index_list(Booking)")
+        for index in cursor.fetchall():
+            if index[2]:
+                cursor.execute(f"PRAGMA index_info({index[1]})")
+                if [column[2] for column in cursor.fetchall()] == ["Date", "Time"]:
+                    return
+        cursor.execute("CREATE UNIQUE INDEX idx_booking_slot ON Booking(Date, Time)")
+
+    def migrate_chairs(self, cursor):
+        cursor.execute(CHAIR_TABLE_SQL)
+        cursor.execute("SELECT COUNT(*) FROM Chair")
+        if cursor.fetchone()[0] == 0:
+            cursor.execute("INSERT INTO Chair (ChairID, Chair_Name) VALUES (1, 'Chair 1')")
+
+        # the old table had UNIQUE(Date, Time) built in, which allowed one customer per hour for the
+        # whole shop, and SQLite can only drop a table constraint by rebuilding the table
+        cursor.execute("PRAGMA table_info(Booking)")
+        if "ChairID" not in [column[1] for column in cursor.fetchall()]:
+            cursor.execute(BOOKING_TABLE_SQL.format(table="Booking_new"))
+            cursor.execute('''
+                INSERT INTO Booking_new (BookingID, Date, Time, CustomerID, HaircutID, Locked, Duration, ExpiryTime)
+                SELECT BookingID, Date, Time, CustomerID, HaircutID, Locked, Duration, ExpiryTime FROM Booking
+            ''')
+            cursor.execute("DROP TABLE Booking")
+            cursor.execute("ALTER TABLE Booking_new RENAME TO Booking")
+
+        cursor.execute("DROP INDEX IF EXISTS idx_booking_slot")
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_booking_chair_slot ON Booking(Date, Time, ChairID)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_booking_customer ON Booking(CustomerID)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_booking_expiry ON Booking(Locked, ExpiryTime)")
+
+    def migrate_booking_autoincrement(self, cursor):
+        # without AUTOINCREMENT a deleted top BookingID is handed out again, which the snapshot's
+        # high-water mark can't tell apart from the booking it already exported
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'Booking'")
+        if "AUTOINCREMENT" in cursor.fetchone()[0].upper():
+            return
+        # DROP TABLE takes the indexes and triggers with it, so they are recreated from their own SQL
+        cursor.execute('''SELECT sql FROM sqlite_master
+                          WHERE tbl_name = 'Booking' AND type IN ('index', 'trigger') AND sql IS NOT NULL''')
+        definitions = [row[0] for row in cursor.fetchall()]
+        cursor.execute(BOOKING_TABLE_SQL.format(table="Booking_new"))
+        cursor.execute('''
+            INSERT INTO Booking_new (BookingID, Date, Time, CustomerID, HaircutID, Locked, Duration, ExpiryTime, ChairID)
+            SELECT BookingID, Date, Time, CustomerID, HaircutID, Locked, Duration, ExpiryTime, ChairID FROM Booking
+        ''')
+        cursor.execute("DROP TABLE Booking")
+        cursor.execute("ALTER TABLE Booking_new RENAME TO Booking")
+        for sql in definitions:
+            cursor.execute(sql)
+
+    def migrate_rollups(self, cursor):
+        for sql in ROLLUP_TABLES_SQL + ROLLUP_TRIGGERS_SQL:
+            cursor.execute(sql)
+        cursor.execute("DELETE FROM BookingRollup")
+        cursor.execute("DELETE FROM CustomerRollup")
+        cursor.execute('''
+            INSERT INTO BookingRollup (Date, Hour, HaircutID, Bookings, LockedBookings, Revenue)
+            SELECT COALESCE(Date, ''), COALESCE(strftime('%H:00', Time), ''), COALESCE(Booking.HaircutID, 0),
+                   COUNT(*), SUM(CASE WHEN Locked = 1 THEN 1 ELSE 0 END), COALESCE(SUM(Haircut.Price), 0)
+            FROM Booking
+            LEFT JOIN Haircut ON Booking.HaircutID = Haircut.HaircutID
+            GROUP BY 1, 2, 3
+        ''')
+        cursor.execute('''
+            INSERT INTO CustomerRollup (CustomerID, HaircutID, Visits, LastVisit)
+            SELECT CustomerID, COALESCE(HaircutID, 0), COUNT(*), MAX(Date)
+            FROM Booking
+            WHERE CustomerID IS NOT NULL
+            GROUP BY 1, 2
+        ''')
+
+    def migrate_data_version(self, cursor):
+        cursor.execute("CREATE TABLE IF NOT EXISTS DataVersion (Name TEXT PRIMARY KEY, Version INTEGER NOT NULL)")
+        cursor.execute("INSERT OR IGNORE INTO DataVersion (Name, Version) VALUES ('analytics', 0)")
+        for sql in DATA_VERSION_TRIGGERS_SQL:
+            cursor.execute(sql)
+
+    def migrate_availability_version(self, cursor):
+        cursor.execute("INSERT OR IGNORE INTO DataVersion (Name, Version) VALUES ('availability', 0)")
+        for sql in AVAILABILITY_VERSION_TRIGGERS_SQL:
+            cursor.execute(sql)
+
+    def migrate_rollup_prices(self, cursor):
+        for sql in ROLLUP_PRICE_TRIGGERS_SQL:
+            cursor.execute(sql)
+        # rows written before these triggers may hold prices from before a price change
+        cursor.execute(f"UPDATE BookingRollup SET Revenue = Bookings * {ROLLUP_PRICE_SQL.format(row='BookingRollup')}")
+
+    def migrate_browse_indexes(self, cursor):
+        # the unbounded list walks idx_booking_chair_slot; the filtered ones seek these
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_booking_haircut_date ON Booking(HaircutID, Date, Time)")
+        cursor.execute("DROP INDEX IF EXISTS idx_booking_customer")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_booking_customer_date ON Booking(CustomerID, Date, Time)")
+
+    def migrate_drop_date_time_index(self, cursor):
+        # (Date, Time) is a prefix of idx_booking_chair_slot, so it only cost a write per booking
+        cursor.execute("DROP INDEX IF EXISTS idx_booking_date_time")
+
+    def add_chair(self, name, staffID=None):
+        cursor = self.execute("INSERT INTO Chair (Chair_Name, StaffID) VALUES (?, ?)", (name, staffID))
+        self.availability.invalidate()
+        return cursor.lastrowid
+
+    def fetch_all_chairs(self):
+        return self.query("SELECT * FROM Chair")
 
     def insert_admin(self):
-        self.cursor.execute("SELECT * FROM Staff WHERE Email=?", ('admin',))
-        admin = self.cursor.fetchone()
+        admin = self.query_one("SELECT * FROM Staff WHERE Email=?", ('admin',))
 
         if not admin:
-            self.cursor.execute('''INSERT INTO Staff (Email, Staff_Number) VALUES (?, ?)''', ('admin', 'admin'))
-            self.connection.commit()
+            self.execute('''INSERT INTO Staff (Email, Staff_Number) VALUES (?, ?)''', ('admin', 'admin'))
 
     def check_table(self):
-        self.cursor.execute("PRAGMA table_info(Customer);")
-        ys = self.cursor.fetchall()
+        ys = self.query("PRAGMA table_info(Customer);")
         print(ys)
 
+    def use_numpy(self):
+        return ANALYTICS_BACKEND == "numpy" and self.numpy_analytics is not None
+
     def get_peak_hours(self, days):
-        self.cursor.execute('''
-            SELECT 
-                strftime('%H:00', Time) AS Hour,
-                COUNT(*) AS Bookings
-            FROM Booking
-            WHERE Date >= date('now', '-' || ? || ' DAYS')
-            AND Locked = 1
-            GROUP BY Hour
-            ORDER BY Bookings DESC
-        ''', (days,))
-        return self.cursor.fetchall()
+        if self.use_numpy():
+            return self.numpy_analytics.peak_hours(days)
+        return self.query(PEAK_HOURS_SQL, (days,))
 
     def get_revenue_breakdown(self, period):
-        self.cursor.execute(f'''
-            SELECT 
-                strftime('%Y-%m', Date) AS Period,
-                Haircut.Haircut_Name,
-                SUM(Haircut.Price) AS Revenue,
-                COUNT(*) AS Bookings
-            FROM Booking
-            JOIN Haircut ON Booking.HaircutID = Haircut.HaircutID
-            WHERE Date >= date('now', '-' || ? || ' DAYS')
-            GROUP BY Period, Haircut.HaircutID
-            ORDER BY Period DESC, Revenue DESC
-        ''', (period,))
-        return self.cursor.fetchall()
+        if self.use_numpy():
+            return self.numpy_analytics.revenue_breakdown(period)
+        return self.query(REVENUE_BREAKDOWN_SQL, (period,))
 
     def get_popular_haircuts(self, days):
-        self.cursor.execute('''
-            SELECT 
-                Haircut.Haircut_Name,
-                COUNT(*) AS Bookings
-            FROM Booking
-            JOIN Haircut ON Booking.HaircutID = Haircut.HaircutID
-            WHERE Booking.Date >= date('now', '-' || ? || ' DAYS')
-            GROUP BY Haircut.HaircutID
-            ORDER BY Bookings DESC
-        ''', (days,))
-        return self.cursor.fetchall()
+        if self.use_numpy():
+            return self.numpy_analytics.popular_haircuts(days)
+        return self.query(POPULAR_HAIRCUTS_SQL, (days,))
 
     def get_loyal_customers(self, min_visits):
-        self.cursor.execute('''
-            SELECT 
-                Customer.FirstName || ' ' || Customer.Surname AS Customer,
-                COUNT(*) AS Visits,
-                GROUP_CONCAT(DISTINCT Haircut.Haircut_Name) AS Styles,
-                MAX(Booking.Date) AS LastVisit
-            FROM Booking
-            JOIN Customer ON Booking.CustomerID = Customer.CustomerID
-            JOIN Haircut ON Booking.HaircutID = Haircut.HaircutID
-            GROUP BY Booking.CustomerID
-            HAVING Visits >= ?
-            ORDER BY Visits DESC
-        ''', (min_visits,))
-        return self.cursor.fetchall()
+        if self.use_numpy():
+            return self.numpy_analytics.loyal_customers(min_visits)
+        return self.query(LOYAL_CUSTOMERS_SQL, (min_visits,))
+
+    # long-range reports, these need numpy
+    def reports(self):
+        if self.numpy_analytics is None:
+            raise ImportError("The long-range reports need numpy installed")
+        return self.numpy_analytics
+
+    def get_weekday_heatmap(self, days):
+        return self.reports().weekday_hour_heatmap(days)
+
+    def get_revenue_trends(self, days, period="M"):
+        return self.reports().revenue_trends(days, period)
+
+    def get_moving_average(self, days, window=7):
+        return self.reports().moving_average(days, window)
+
+    def get_retention_cohorts(self, months=12):
+        return self.reports().retention_cohorts(months)
+
+    def analytics_version(self):
+        return self.query_one(ANALYTICS_VERSION_SQL)[0]
+
+    def analytics_key(self, days, min_visits, version):
+        # the windows are relative to today, so the date is part of the key as well as the data version
+        return days, min_visits, version, datetime.now().strftime("%Y-%m-%d")
+
+    def store_analytics(self, key, snapshot):
+        # anything cached under an older version can never be hit again
+        self.analytics_cache = {cached: value for cached, value in self.analytics_cache.items()
+                                if cached[2:] == key[2:]}
+        self.analytics_cache[key] = snapshot
+
+    def get_analytics_snapshot(self, days, min_visits=3):
+        key = self.analytics_key(days, min_visits, self.analytics_version())
+        snapshot = self.analytics_cache.get(key)
+        if snapshot is None:
+            snapshot = {
+                "peak_hours": self.get_peak_hours(days),
+                "revenue": self.get_revenue_breakdown(days),
+                "popular_haircuts": self.get_popular_haircuts(days),
+                "loyal_customers": self.get_loyal_customers(min_visits),
+            }
+            self.store_analytics(key, snapshot)
+        return snapshot
 
     def insert_customer(self, surname, firstname, email, hashed_password, salt, date_of_birth):
-        self.cursor.execute('''INSERT INTO Customer (Surname, FirstName, Email, 
-        Hashed_Password, Salt, Date_Of_Birth) VALUES (?, ?, ?, ?, ?, ?)''', (surname, firstname, email,
-                                                                             hashed_password, salt, date_of_birth))
-        self.connection.commit()
+        self.insert_customers([(surname, firstname, email, hashed_password, salt, date_of_birth)])
 
-    def insert_haircut(self, haircutname, price, estimated_time):
-        self.cursor.execute('''INSERT INTO Haircut (Haircut_Name, Price, Estimated_Time) VALUES (?,?,?)''',
-                            (haircutname, price, estimated_time))
+    def insert_customers(self, customers):
+        # (surname, firstname, email, hashed_password, salt, date_of_birth) tuples, one commit for all
+        customers = list(customers)
+        with self.transaction() as cursor:
+            cursor.executemany('''INSERT INTO Customer (Surname, FirstName, Email,
+            Hashed_Password, Salt, Date_Of_Birth) VALUES (?, ?, ?, ?, ?, ?)''', customers)
+        for customer in customers:
+            self.credentials.discard(("customer", customer[2]))
 
-    def insert_booking(self, date, time, customerID, haircutID):
-        try:
-            self.cursor.execute("SELECT Estimated_Time FROM Haircut WHERE HaircutID=?", (haircutID,))
-            duration = self.cursor.fetchone()[0]
+    def update_password(self, CustomerID, hashed_password, salt):
+        self.execute("UPDATE Customer SET Hashed_Password=?, Salt=? WHERE CustomerID=?",
+                     (hashed_password, salt, CustomerID))
+        self.forget_customer(CustomerID)
 
-            available = self.get_available_slots(date)
-            if not available or time not in available:
-                messagebox.showerror("Time slot is already booked or unavailable")
+    def forget_customer(self, CustomerID):
+        self.credentials.discard_if(lambda key, row: key[0] == "customer" and row and row[0] == CustomerID)
 
-            self.cursor.execute("""
-                INSERT INTO Booking (Date, Time, CustomerID, HaircutID, Locked, Duration) 
-                VALUES (?, ?, ?, ?, 1, ?)
-            """, (date, time, customerID, haircutID, duration))
+    def insert_haircut(self, haircutname, price, estimated_time):
+        self.insert_haircuts([(haircutname, price, estimated_time)])
 
-            self.connection.commit()
-            return True
+    def insert_haircuts(self, haircuts):
+        with self.transaction() as cursor:
+            cursor.executemany('''INSERT INTO Haircut (Haircut_Name, Price, Estimated_Time) VALUES (?,?,?)''',
+                               haircuts)
 
-        except:
-            self.connection.rollback()
-            messagebox.showerror("Error while trying to insert booking.")
+    def insert_booking(self, date, time, customerID, haircutID):
+        # returns whether the booking was made, as it always has
+        haircut = self.query_one("SELECT Estimated_Time FROM Haircut WHERE HaircutID=?", (haircutID,))
+        if haircut is None:
+            return False
+        try:
+            return self.reserve_slot(date, time, customerID, haircutID, haircut[0]).reserved
+        except ValidationError:
             return False
 
+    def reserve_slot(self, date, time, customerID, haircutID, duration, expiry=None, chairID=None):
+        time = self.availability.slot_time(time)
+        start = time_to_minutes(time)
+        end = start + parse_duration(duration)
+        if start < self.availability.opening or end > self.availability.closing:
+            return Reservation(None, "closed")
+
+        if chairID is not None:
+            chairs = [chairID]
+        else:
+            # chairs the cache thinks are free first, the rest in case another terminal freed one
+            free = self.availability.free_chairs(date, time, duration)
+            chairs = free + [chair for chair in self.availability.active_chairs() if chair not in free]
+
+        row = None
+        with self.transaction("BEGIN IMMEDIATE") as cursor:
+            before = cursor.execute(AVAILABILITY_VERSION_SQL).fetchone()[0]
+            for chair in chairs:
+                cursor.execute(RESERVE_SLOT_SQL, {
+                    "date": date, "time": time, "customer": customerID, "haircut": haircutID,
+                    "locked": 0 if expiry else 1, "duration": duration, "expiry": expiry, "chair": chair,
+                    "now": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "start": start, "end": end,
+                })
+                row = cursor.fetchone()
+                if row is not None:
+                    break
+            after = cursor.execute(AVAILABILITY_VERSION_SQL).fetchone()[0]
+
+        if row is None:
+            self.availability.invalidate(date)  # another terminal got there first, our cache is stale
+            return Reservation(None, "taken")
+        self.availability.add_booking(row[0], date, time, duration, expiry, chair)
+        self.availability.advance(before, after)
+        if expiry:
+            self.holds.push(expiry, row[0])
+        return Reservation(row[0], None)
+
+    def confirm_booking(self, BookingID):
+        with self.transaction() as cursor:
+            before = cursor.execute(AVAILABILITY_VERSION_SQL).fetchone()[0]
+            cursor.execute("UPDATE Booking SET Locked = 1, ExpiryTime = NULL WHERE BookingID = ?", (BookingID,))
+            after = cursor.execute(AVAILABILITY_VERSION_SQL).fetchone()[0]
+        self.availability.confirm_booking(BookingID)
+        self.availability.advance(before, after)
+
     def fetch_customer_email(self, email):
-        self.cursor.execute("SELECT * FROM Customer WHERE Email=?", (email,))
-        return self.cursor.fetchone()
+        return self.query_one("SELECT * FROM Customer WHERE Email=?", (email,))
 
     def fetch_staff_number(self, Staff_Number):
-        self.cursor.execute("SELECT * FROM Staff WHERE Staff_Number=?", (Staff_Number,))
+        return self.query_one("SELECT * FROM Staff WHERE Staff_Number=?", (Staff_Number,))
+
+    # login and staff checks go through the credential cache and read only the columns they compare
+    def fetch_credentials(self, email):
+        return self.credentials.get(("customer", email), lambda: self.query_one(
+            "SELECT CustomerID, Hashed_Password, Salt FROM Customer WHERE Email=?", (email,)))
+
+    def fetch_staff_credentials(self, Staff_Number):
+        return self.credentials.get(("staff", Staff_Number), lambda: self.query_one(
+            "SELECT StaffID, Staff_Number FROM Staff WHERE Staff_Number=?", (Staff_Number,)))
 
     def fetch_all_customers(self):
-        self.cursor.execute("SELECT * FROM Customer")
-        return self.cursor.fetchall()
+        return self.query("SELECT * FROM Customer")
 
     def fetch_all_haircuts(self):
-        self.cursor.execute("SELECT * FROM Haircut")
-        return self.cursor.fetchall()
+        return self.query("SELECT * FROM Haircut")
 
     def fetch_all_bookings(self):
-        self.cursor.execute("SELECT * FROM Booking")
-        return self.cursor.fetchall()
+        return self.query("SELECT * FROM Booking")
 
     def fetch_all_staff(self):
-        self.cursor.execute("SELECT * FROM Staff")
-        return self.cursor.fetchall()
+        return self.query("SELECT * FROM Staff")
 
 
     def fetch_all_data(self):
+        # bookings are left out, the Bookings tab pages through fetch_booking_page instead
         customers = self.fetch_all_customers()
         haircuts = self.fetch_all_haircuts()
-        bookings = self.fetch_all_bookings()
         staff = self.fetch_all_staff()
-        return {"customers": customers, "haircuts": haircuts, "bookings": bookings, "staff": staff}
+        return {"customers": customers, "haircuts": haircuts, "staff": staff}
+
+    def booking_filters(self, date_from=None, date_to=None, customerID=None, haircutID=None):
+        where = []
+        params = []
+        if date_from:
+            where.append("Date >= ?")
+            params.append(date_from)
+        if date_to:
+            where.append("Date <= ?")
+            params.append(date_to)
+        if customerID is not None:
+            where.append("CustomerID = ?")
+            params.append(customerID)
+        if haircutID is not None:
+            where.append("HaircutID = ?")
+            params.append(haircutID)
+        return where, params
+
+    def count_bookings(self, **filters):
+        where, params = self.booking_filters(**filters)
+        return self.query_one(f"SELECT COUNT(*) FROM Booking {'WHERE ' + ' AND '.join(where) if where else ''}",
+                              params)[0]
+
+    def fetch_booking_page(self, order="date", ascending=True, after=None, limit=BOOKING_PAGE_SIZE, offset=0,
+                           **filters):
+        # keyset pagination: "after" is the order key of the previous page's last row, so every
+        # page is an index seek instead of an OFFSET scan. offset is only for jumping straight
+        # to a page nobody has loaded yet
+        columns = BOOKING_ORDERS[order][0]
+        where, params = self.booking_filters(**filters)
+        if after is not None:
+            where.append(f"({', '.join(columns)}) {'>' if ascending else '<'} ({', '.join('?' * len(columns))})")
+            params.extend(after)
+
+        direction = "ASC" if ascending else "DESC"
+        return self.query(f'''
+            SELECT * FROM Booking
+            {"WHERE " + " AND ".join(where) if where else ""}
+            ORDER BY {", ".join(f"{column} {direction}" for column in columns)}
+            LIMIT ? OFFSET ?
+        ''', params + [limit, offset])
+
+    def count_rows(self, table):
+        return self.query_one(f"SELECT COUNT(*) FROM {table}")[0]
+
+    def fetch_table_page(self, table, after=None, limit=VIRTUAL_PAGE_SIZE, offset=0):
+        # same idea as fetch_booking_page for the small tables, ordered by primary key
+        key = TABLE_KEYS[table]
+        if after is None:
+            return self.query(f"SELECT * FROM {table} ORDER BY {key} LIMIT ? OFFSET ?", (limit, offset))
+        return self.query(f"SELECT * FROM {table} WHERE {key} > ? ORDER BY {key} LIMIT ?", (after, limit))
+
+    def get_available_slots(self, date, duration=SLOT_MINUTES):
+        return self.availability.free_starts(date, duration)
+
+    def get_haircut_duration(self, haircutID):
+        haircut = self.query_one("SELECT Estimated_Time FROM Haircut WHERE HaircutID=?", (haircutID,))
+        if haircut:
+            return parse_duration(haircut[0])
+        return SLOT_MINUTES
+
+    def get_available_slots_range(self, start_date, end_date, haircutID=None):
+        duration = self.get_haircut_duration(haircutID) if haircutID is not None else SLOT_MINUTES
+        return self.availability.free_starts_range(start_date, end_date, duration)
+
+    def get_next_free_slot(self, start_date, days=7, haircutID=None):
+        end_date = (datetime.strptime(start_date, "%Y-%m-%d") + timedelta(days=days - 1)).strftime("%Y-%m-%d")
+        for date, slots in self.get_available_slots_range(start_date, end_date, haircutID).items():
+            if slots:
+                return date, slots[0]
+        return None
+
+    def remove_customer(self, CustomerID):
+        self.remove_customers([CustomerID])
+
+    def remove_haircut(self, HaircutID):
+        self.remove_haircuts([HaircutID])
+
+    def remove_booking(self, BookingID):
+        self.remove_bookings([BookingID])
+
+    def remove_staff(self, StaffID):
+        self.remove_staff_members([StaffID])
+
+    # bulk removals run as one transaction, so deleting a selection costs a single commit
+    def remove_customers(self, CustomerIDs):
+        CustomerIDs = set(CustomerIDs)
+        with self.transaction() as cursor:
+            cursor.executemany('''DELETE FROM Customer WHERE CustomerID = ?''', [(key,) for key in CustomerIDs])
+        self.credentials.discard_if(lambda key, row: key[0] == "customer" and row and row[0] in CustomerIDs)
+
+    def remove_haircuts(self, HaircutIDs):
+        with self.transaction() as cursor:
+            cursor.executemany('''DELETE FROM Haircut WHERE HaircutID = ?''', [(key,) for key in HaircutIDs])
+
+    def remove_bookings(self, BookingIDs):
+        BookingIDs = list(BookingIDs)
+        with self.transaction() as cursor:
+            before = cursor.execute(AVAILABILITY_VERSION_SQL).fetchone()[0]
+            cursor.executemany('''DELETE FROM Booking WHERE BookingID = ?''', [(key,) for key in BookingIDs])
+            after = cursor.execute(AVAILABILITY_VERSION_SQL).fetchone()[0]
+        for BookingID in BookingIDs:
+            self.availability.remove_booking(BookingID)
+        self.availability.advance(before, after)
+
+    def remove_staff_members(self, StaffIDs):
+        StaffIDs = set(StaffIDs)
+        with self.transaction() as cursor:
+            cursor.executemany('''DELETE FROM Staff WHERE StaffID = ?''', [(key,) for key in StaffIDs])
+        self.credentials.discard_if(lambda key, row: key[0] == "staff" and row and row[0] in StaffIDs)
+
+    def remove_expired_bookings(self):
+        with self.transaction() as cursor:
+            expired = delete_expired_bookings(cursor)
+        if expired:
+            self.availability.invalidate()
+        self.holds.load(self.query('''
+            SELECT ExpiryTime, BookingID FROM Booking
+            WHERE Locked = 0 AND ExpiryTime IS NOT NULL
+        '''))
+        return expired
+
+
+class BookingPager:
+    # page source for a VirtualList of bookings: a page that follows one already loaded is a
+    # keyset seek from its last row, anything else (a scrollbar jump) falls back to OFFSET
+    def __init__(self, db):
+        self.db = db
+        self.order = "date"
+        self.ascending = True
+        self.filters = {}
+
+    def cursor(self, row):
+        return tuple(row[index] for index in BOOKING_ORDERS[self.order][1])
+
+    def count(self):
+        return self.db.count_bookings(**self.filters)
+
+    def page(self, number, size, after=None):
+        if after is not None:
+            return self.db.fetch_booking_page(self.order, self.ascending, after, size, **self.filters)
+        return self.db.fetch_booking_page(self.order, self.ascending, None, size, number * size, **self.filters)
+
+    def sort(self, order, ascending=True):
+        self.order = order
+        self.ascending = ascending
+
+    def filter(self, **filters):
+        self.filters = {name: value for name, value in filters.items() if value not in (None, "")}
+
+
+class TablePager:
+    # page source for the customer, haircut and staff lists, ordered by primary key
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+
+    def cursor(self, row):
+        return row[0]
+
+    def count(self):
+        return self.db.count_rows(self.table)
 
-    def get_available_slots(self, date):
+    def page(self, number, size, after=None):
+        if after is not None:
+            return self.db.fetch_table_page(self.table, after, size)
+        return self.db.fetch_table_page(self.table, None, size, number * size)
+
+
+class BookingService:
+    def __init__(self, db, auth):
+        self.db = db
+        self.auth = auth
+
+    def validate_date(self, date):
         try:
-            self.cursor.execute("""
-                SELECT Time FROM Booking 
-                WHERE Date = ? 
-                AND (
-                    Locked = 1 
-                    OR 
-                    (ExpiryTime > datetime('now'))
-            """, (date,))
+            datetime.strptime(date, "%Y-%m-%d")
+        except (TypeError, ValueError):
+            raise ValidationError("Please enter the date as YYYY-MM-DD")
 
-            unavailable_times = {row[0] for row in self.cursor.fetchall()}
+    def validate_payment(self, card_number, card_cvc, expiry_date):
+        if not (card_number.isdigit() and len(card_number) >= 13):
+            raise ValidationError("Invalid card number (must be at least 13 digits)")
 
-            all_slots = [f"{hour:02d}:00" for hour in range(9, 18)]
+        if not (card_cvc.isdigit() and len(card_cvc) == 3):
+            raise ValidationError("Invalid CVC (must be 3 digits)")
 
-            available_slots = []
-            for slot in all_slots:
-                if slot not in unavailable_times:
-                    available_slots.append(slot)
-            return available_slots
+        try:
+            month, year = expiry_date.split('/')
+            if not (1 <= int(month) <= 12):
+                raise ValueError
+            if int(year) < datetime.now().year % 100:
+                raise ValueError
+        except ValueError:
+            raise ValidationError("Invalid expiry date (use MM/YY format)")
+
+    def haircuts(self):
+        return self.db.fetch_all_haircuts()
+
+    def service_duration(self, haircutID):
+        if haircutID is None:
+            return SLOT_MINUTES
+        haircut = self.db.query_one("SELECT Estimated_Time FROM Haircut WHERE HaircutID=?", (haircutID,))
+        if haircut is None:
+            raise ValidationError("Unknown haircut")
+        return parse_duration(haircut[0])
+
+    def available_slots(self, date, haircutID=None):
+        self.validate_date(date)
+        return self.db.get_available_slots(date, self.service_duration(haircutID))
+
+    def available_range(self, start_date, end_date, haircutID=None):
+        self.validate_date(start_date)
+        self.validate_date(end_date)
+        if end_date < start_date:
+            raise ValidationError("The end date must not be before the start date")
+        span = (datetime.strptime(end_date, "%Y-%m-%d") - datetime.strptime(start_date, "%Y-%m-%d")).days + 1
+        if span > MAX_RANGE_DAYS:
+            raise ValidationError(f"Please ask for at most {MAX_RANGE_DAYS} days at a time")
+        self.service_duration(haircutID)
+        return self.db.get_available_slots_range(start_date, end_date, haircutID)
+
+    def next_free_slot(self, start_date, days=7, haircutID=None):
+        self.validate_date(start_date)
+        if not 1 <= days <= MAX_RANGE_DAYS:
+            raise ValidationError(f"Please search between 1 and {MAX_RANGE_DAYS} days ahead")
+        self.service_duration(haircutID)
+        return self.db.get_next_free_slot(start_date, days, haircutID)
+
+    def book(self, customerID, date, time, haircut_name, card_number, card_cvc, expiry_date):
+        today = datetime.now().strftime("%Y-%m-%d")
+        if date is None:
+            date = today
+        self.validate_date(date)
+        time = self.db.availability.slot_time(time)
+        if date < today or (date == today and time < datetime.now().strftime("%H:%M")):
+            raise ValidationError("Cannot book past time slots")
+
+        self.validate_payment(card_number, card_cvc, expiry_date)
+
+        haircut = self.db.query_one(
+            "SELECT HaircutID, Price, Estimated_Time FROM Haircut WHERE Haircut_Name = ?",
+            (haircut_name,)
+        )
+        if not haircut:
+            raise NotFoundError("Selected haircut not found")
+        haircut_id, price, duration = haircut
+
+        expiry_time = (datetime.now() + timedelta(minutes=HOLD_MINUTES)).strftime("%Y-%m-%d %H:%M:%S")
+        reservation = self.db.reserve_slot(date, time, customerID, haircut_id, duration, expiry_time)
+        if not reservation.reserved:
+            raise SlotUnavailableError("This time slot is no longer available")
+
+        payment_success = True
+        if not payment_success:
+            # the unpaid hold is deleted by the maintenance thread when it expires
+            raise ValidationError("Payment was declined")
+
+        self.db.confirm_booking(reservation.booking_id)
+        return {"booking_id": reservation.booking_id, "date": date, "time": time, "service": haircut_name,
+                "duration": parse_duration(duration), "price": price}
+
+    def login(self, email, password):
+        token = self.auth.submit_login(email, password).result()
+        if not token:
+            raise AuthenticationError("Invalid email or password.")
+        customer = self.db.fetch_customer_email(email)
+        return {"customer_id": customer[0], "surname": customer[1], "first_name": customer[2], "email": customer[3],
+                "token": token}
+
+    def staff_login(self, staff_number, client=None):
+        # staff numbers are the whole credential, so attempts are limited per client, not per number
+        self.auth.check_rate(f"staff:{client or staff_number}")
+        token = self.auth.start_staff_session(str(staff_number or ""), allow_default=False)
+        if not token:
+            raise AuthenticationError("Invalid Staff ID")
+        return {"staff_number": staff_number, "token": token}
+
+    def book_for_session(self, token, date, time, haircut_name, card_number, card_cvc, expiry_date):
+        # the customer comes from the login token, never from the request
+        customerID = self.auth.sessions.validate(token, "customer")
+        if customerID is None:
+            raise AuthenticationError("Please log in to book")
+        return self.book(customerID, date, time, haircut_name, card_number, card_cvc, expiry_date)
+
+    def require_staff(self, token):
+        if not self.auth.is_staff(token):
+            raise AuthenticationError("A staff session is required")
+
+    def analytics(self, days=30, token=None):
+        self.require_staff(token)
+        return self.db.get_analytics_snapshot(days)
+
+
+def request_body(raw):
+    # shared by both servers, so a body either becomes a dict or a 400
+    try:
+        body = json.loads(raw or b"{}")
+    except ValueError:
+        raise ValidationError("Request body must be JSON")
+    if not isinstance(body, dict):
+        raise ValidationError("Request body must be a JSON object")
+    return body
+
+
+def service_route(service, method, path, params, body, client=None):
+    # JSON over HTTP: GET /haircuts, /slots, /slots/range, /slots/next, /analytics
+    # and POST /bookings (with a customer token), /login, /staff-login
+    # returns the call to make and, for read-only calls, a key identical requests can share
+    def haircut_param():
+        return int(params["haircut"]) if params.get("haircut") else None
+
+    def text(name, required=True):
+        value = body.get(name)
+        if value is None or value == "":
+            if required:
+                raise ValidationError(f"{name} is required")
+            return None
+        if not isinstance(value, str):
+            raise ValidationError(f"{name} must be a string")
+        return value
+
+    if method == "GET":
+        if path == "/haircuts":
+            return service.haircuts, ("haircuts",)
+        if path == "/slots":
+            date, haircut = params.get("date"), haircut_param()
+            return lambda: service.available_slots(date, haircut), ("slots", date, haircut)
+        if path == "/slots/range":
+            start, end, haircut = params.get("start"), params.get("end"), haircut_param()
+            return lambda: service.available_range(start, end, haircut), ("range", start, end, haircut)
+        if path == "/slots/next":
+            start, days, haircut = params.get("start"), int(params.get("days", 7)), haircut_param()
+            return lambda: service.next_free_slot(start, days, haircut), ("next", start, days, haircut)
+        if path == "/analytics":
+            days, token = int(params.get("days", 30)), params.get("token")
+            return lambda: service.analytics(days, token), ("analytics", days, token)
+    elif method == "POST":
+        if not isinstance(body, dict):
+            raise ValidationError("Request body must be a JSON object")
+        if path == "/bookings":
+            token, date, time, haircut = text("token"), text("date", False), text("time"), text("service")
+            return lambda: service.book_for_session(token, date, time, haircut, str(body.get("card_number", "")),
+                                                    str(body.get("card_cvc", "")), str(body.get("expiry_date", ""))), None
+        if path == "/login":
+            email, password = text("email"), text("password")
+            return lambda: service.login(email, password), None
+        if path == "/staff-login":
+            staff_number = text("staff_number")
+            return lambda: service.staff_login(staff_number, client), None
+    return None, None
+
+
+ERROR_STATUS = [
+    (ValidationError, 400),
+    (RateLimitError, 429),
+    (AuthenticationError, 401),
+    (NotFoundError, 404),
+    (SlotUnavailableError, 409),
+    (ServiceBusyError, 503),
+]
+
+
+def error_response(error):
+    if isinstance(error, BookingError):
+        return next(code for error_type, code in ERROR_STATUS if isinstance(error, error_type)), str(error)
+    if isinstance(error, (KeyError, TypeError, ValueError)):
+        return 400, f"Bad request: {error}"
+    if isinstance(error, sqlite3.Error):
+        return 500, "Database error"
+    # anything else is a bug, but the client still gets a reply and the server keeps running
+    traceback.print_exception(error)
+    return 500, "Internal server error"
+
+
+class BookingRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        self.respond("GET", url.path, params, b"")
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            self.send_json(400, {"error": "Invalid Content-Length"})
+            return
+        self.respond("POST", urlparse(self.path).path, {}, self.rfile.read(length))
 
+    def respond(self, method, path, params, raw_body):
+        try:
+            body = request_body(raw_body) if method == "POST" else {}
+            route, key = service_route(self.server.service, method, path, params, body, self.client_address[0])
+            if route is None:
+                self.send_json(404, {"error": "Unknown endpoint"})
+                return
+            self.send_json(200, {"result": route()})
+        except Exception as error:
+            status, message = error_response(error)
+            self.send_json(status, {"error": message})
 
-        except:
-            messagebox.showerror("There was an error finding available slots")
-            return []
+    def send_json(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
 
-    def remove_customer(self, CustomerID):
-        self.cursor.execute('''DELETE FROM Customer WHERE CustomerID = ?''', (CustomerID,))
-        self.connection.commit()
+    def log_message(self, format, *args):
+        pass
 
-    def remove_haircut(self, HaircutID):
-        self.cursor.execute('''DELETE FROM Haircut WHERE HaircutID = ?''', (HaircutID,))
-        self.connection.commit()
 
-    def remove_booking(self, BookingID):
-        self.cursor.execute('''DELETE FROM Booking WHERE BookingID = ?''', (BookingID,))
-        self.connection.commit()
+class BookingServer(HTTPServer):
+    def __init__(self, service, host=SERVICE_HOST, port=SERVICE_PORT, workers=SERVICE_WORKERS):
+        super().__init__((host, port), BookingRequestHandler)
+        self.service = service
+        self.workers = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="booking")
 
-    def remove_expired_bookings(self):
+    def process_request(self, request, client_address):
+        self.workers.submit(self.process_request_worker, request, client_address)
+
+    def process_request_worker(self, request, client_address):
         try:
-            self.connection.execute("BEGIN TRANSACTION")
-            self.cursor.execute('''
-                DELETE FROM Booking 
-                WHERE Locked = 0 AND ExpiryTime <= datetime('now')
-            ''')
-            self.connection.commit()
-            return self.cursor.rowcount
-        except:
-            self.connection.rollback()
-            messagebox.showerror("Error while removing expired bookings")
-            return 0
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.service.db.pool.release_reader()  # workers outnumber pooled readers
+
+    def server_close(self):
+        super().server_close()
+        self.workers.shutdown(wait=True)
+
+
+class AsyncBookingService:
+    # runs blocking service calls on a bounded executor from the event loop; identical read-only
+    # calls already in flight share one result, and callers beyond max_pending are turned away
+    def __init__(self, service, workers=READER_CONNECTIONS, max_pending=ASYNC_MAX_PENDING):
+        self.service = service
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="booking-async")
+        self.running = asyncio.Semaphore(workers)
+        self.max_pending = max_pending
+        self.pending = 0
+        self.in_flight = {}
+
+    async def call(self, route, key=None):
+        if key is None:
+            return await self.run(route)
+        task = self.in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self.run(route))
+            self.in_flight[key] = task
+            task.add_done_callback(lambda done: self.in_flight.pop(key, None))
+        # shield so one client disconnecting doesn't cancel the result for everyone sharing it
+        return await asyncio.shield(task)
+
+    async def run(self, route):
+        if self.pending >= self.max_pending:
+            raise ServiceBusyError("The booking service is busy, please try again shortly")
+        self.pending += 1
+        try:
+            async with self.running:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self.executor, self.run_in_worker, route)
+        finally:
+            self.pending -= 1
+
+    def run_in_worker(self, route):
+        try:
+            return route()
+        finally:
+            self.service.db.pool.release_reader()
 
-    def merge_sort(self, records, sortby='id', ascending=True):
-        fields = ['id', 'name', 'date']
+    async def available_slots(self, date, haircutID=None):
+        route, key = service_route(self.service, "GET", "/slots",
+                                   {"date": date, "haircut": haircutID}, {})
+        return await self.call(route, key)
 
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+class AsyncBookingServer:
+    def __init__(self, service, host=SERVICE_HOST, port=SERVICE_PORT, max_pending=ASYNC_MAX_PENDING):
+        self.host = host
+        self.port = port
+        self.backend = AsyncBookingService(service, max_pending=max_pending)
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        self.backend.close()
+
+    async def handle_connection(self, reader, writer):
         try:
-            sort_index = fields.index(sortby)
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                raw_body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                status, payload = await self.respond(method, target, raw_body, writer.get_extra_info("peername"))
+                data = json.dumps(payload).encode()
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                writer.write(
+                    f"{version} {status} {HTTPStatus(status).phrase}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ValueError, ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, method, target, raw_body, peer=None):
+        # every failure, including one shared by a coalesced batch, becomes a status and a message
+        try:
+            url = urlparse(target)
+            params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            body = request_body(raw_body) if method == "POST" else {}
+            route, key = service_route(self.backend.service, method, url.path, params, body, peer and peer[0])
+            if route is None:
+                return 404, {"error": "Unknown endpoint"}
+            return 200, {"result": await self.backend.call(route, key)}
+        except Exception as error:
+            status, message = error_response(error)
+            return status, {"error": message}
+
+
+def start_service():
+    db = DatabaseManager()
+    if GROUP_COMMIT_MS:
+        db.group_commit(GROUP_COMMIT_MS)
+    service = BookingService(db, AuthManager(db))
+    db.remove_expired_bookings()
+    maintenance = MaintenanceScheduler(db.pool.path)
+    maintenance.watch_holds(db.holds)
+    if db.use_numpy():
+        maintenance.add_job("snapshot", SNAPSHOT_INTERVAL, export_snapshot)
+    maintenance.start()
+
+    def release_expired_holds():
+        while maintenance.is_alive():
+            try:
+                name, result = maintenance.results.get(timeout=1)
+            except queue.Empty:
+                continue
+            if name == "expired_holds" and not isinstance(result, Exception):
+                for booking_id in result:
+                    db.availability.remove_booking(booking_id)
+
+    threading.Thread(target=release_expired_holds, daemon=True).start()
+    return service, maintenance
+
+
+def run_service(host=SERVICE_HOST, port=SERVICE_PORT):
+    service, maintenance = start_service()
+    server = BookingServer(service, host, port)
+    print(f"Booking service listening on http://{host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        maintenance.stop()
+        server.server_close()
+        service.db.end_group_commit()
+
+
+def run_async_service(host=SERVICE_HOST, port=SERVICE_PORT):
+    service, maintenance = start_service()
+    server = AsyncBookingServer(service, host, port)
+
+    async def serve():
+        await server.start()
+        print(f"Async booking service listening on http://{host}:{server.port}")
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        maintenance.stop()
+        service.db.end_group_commit()
+
+
+class AnalyticsView:
+    # shared by the dashboard windows; expects peak_canvas, revenue_tree, popularity_text,
+    # loyalty_tree, days_var and analytics_worker on the instance
+    analytics_generation = None
+
+    def refresh_analytics(self):
+        try:
+            days = int(self.days_var.get())
         except ValueError:
-            sort_index = 0
+            days = 30
+            self.days_var.set("30")
+
+        self.analytics_days = days
+        self.analytics_generation = self.analytics_worker.submit(days)
 
-        if len(records) <= 1:
-            return records
+    def days_changed(self, *args):
+        # typing into the combobox fires this on every keystroke, the worker drops the stale ones
+        try:
+            int(self.days_var.get())
+        except ValueError:
+            return
+        self.refresh_analytics()
 
-        mid = len(records) // 2
-        leftlist = self.merge_sort(records[:mid], sortby, ascending)
-        rightlist = self.merge_sort(records[mid:], sortby, ascending)
+    def poll_analytics(self, window):
+        if not window.winfo_exists():
+            return
+        while True:
+            try:
+                generation, panel, rows = self.analytics_worker.results.get_nowait()
+            except queue.Empty:
+                break
+            if generation == self.analytics_generation:
+                self.show_analytics_panel(panel, rows)
+        window.after(50, self.poll_analytics, window)
+
+    def show_analytics_panel(self, panel, rows):
+        if panel == "error":
+            messagebox.showerror("Error", f"Could not load analytics: {rows}")
+        elif panel == "peak_hours":
+            self.refresh_peak_hours(rows, self.analytics_days)
+        elif panel == "revenue":
+            self.show_revenue(rows)
+        elif panel == "popular_haircuts":
+            self.show_popularity(rows)
+        elif panel == "loyal_customers":
+            self.show_loyalty(rows)
+
+    def show_revenue(self, revenue_data):
+        for item in self.revenue_tree.get_children():
+            self.revenue_tree.delete(item)
+        for row in revenue_data:
+            self.revenue_tree.insert("", "end", values=row)
 
-        sorted_list = []
-        left_pointer = 0
-        right_pointer = 0
+    def show_popularity(self, popularity_data):
+        self.popularity_text.config(state="normal")
+        self.popularity_text.delete(1.0, "end")
+        total = sum(item[1] for item in popularity_data) if popularity_data else 1
+        max_count = max((item[1] for item in popularity_data), default=0)
 
-        while left_pointer < len(leftlist) and right_pointer < len(rightlist):
-            left_value = leftlist[left_pointer][sort_index]
-            right_value = rightlist[right_pointer][sort_index]
+        for haircut, count in popularity_data:
+            percentage = (count / total) * 100
+            bar = "■" * int(percentage / 5)
+            self.popularity_text.insert("end",
+                                        f"{haircut.ljust(15)} {bar} {percentage:.1f}% ({count} bookings)\n",
+                                        ("bold" if count == max_count else "normal"))
 
-            if sortby == 'date':
-                try:
-                    left_date = datetime.strptime(left_value, "%Y-%m-%d")
-                    right_date = datetime.strptime(right_value, "%Y-%m-%d")
-                    left_value = left_date
-                    right_value = right_date
-                except ValueError:
-                    pass
-            elif str(left_value).isdigit():
-                left_value = int(left_value)
-                right_value = int(right_value)
-
-            if ascending:
-                if left_value < right_value:
-                    sorted_list.append(leftlist[left_pointer])
-                    left_pointer += 1
-                else:
-                    sorted_list.append(rightlist[right_pointer])
-                    right_pointer += 1
-            else:
-                if left_value > right_value:
-                    sorted_list.append(leftlist[left_pointer])
-                    left_pointer += 1
-                else:
-                    sorted_list.append(rightlist[right_pointer])
-                    right_pointer += 1
+        self.popularity_text.tag_config("bold", font=(FONT[0], FONT[1], "bold"))
+        self.popularity_text.config(state="disabled")
+
+    def show_loyalty(self, loyalty_data):
+        for item in self.loyalty_tree.get_children():
+            self.loyalty_tree.delete(item)
+        for row in loyalty_data:
+            self.loyalty_tree.insert("", "end", values=row[:3])
+
+    def refresh_peak_hours(self, peak_data, days):
+        self.peak_canvas.delete("all")
+
+        if not peak_data:
+            self.peak_canvas.create_text(300, 150, text="No booking data", fill=TEXT_COLOR)
+            return
+
+        canvas_width = 600
+        canvas_height = 300
+
+        max_bookings = max(item[1] for item in peak_data)
+        left_margin = 50
+        right_margin = 30
+        bottom_margin = 40
+        top_margin = 20
+        available_width = canvas_width - left_margin - right_margin
+        available_height = canvas_height - bottom_margin - top_margin
+
+        num_bars = len(peak_data)
+        bar_width = min(30, available_width / num_bars - 5)
+        gap = (available_width - (num_bars * bar_width)) / (num_bars + 1)
+
+        self.peak_canvas.create_line(
+            left_margin, canvas_height - bottom_margin,
+                         canvas_width - right_margin, canvas_height - bottom_margin,
+            width=2
+        )
+        self.peak_canvas.create_line(
+            left_margin, canvas_height - bottom_margin,
+            left_margin, top_margin,
+            width=2
+        )
+
+        for i, (hour, bookings) in enumerate(peak_data):
+            x0 = left_margin + gap + i * (bar_width + gap)
+            y0 = canvas_height - bottom_margin
+            bar_height = (bookings / max_bookings) * available_height if max_bookings > 0 else 0
+            y1 = y0 - bar_height
+
+            self.peak_canvas.create_rectangle(
+                x0, y1, x0 + bar_width, y0,
+                fill=SECONDARY_COLOR, outline=PRIMARY_COLOR, width=1
+            )
+            self.peak_canvas.create_rectangle(
+                x0 + 2, y1 + 2, x0 + bar_width + 2, y0 + 2,
+                fill=SECONDARY_COLOR, outline="", width=0
+            )
 
-        sorted_list.extend(leftlist[left_pointer:])
-        sorted_list.extend(rightlist[right_pointer:])
-        return sorted_list
+            hour_label = self.peak_canvas.create_text(
+                x0 + bar_width / 2, y0 + 10,
+                text=hour, fill=TEXT_COLOR, angle=45, anchor="n"
+            )
+
+            self.peak_canvas.create_text(
+                x0 + bar_width / 2, y1 - 10,
+                text=str(bookings), fill=PRIMARY_COLOR, font=(FONT[0], FONT[1], "bold")
+            )
 
+        for i in range(0, 6):
+            y = canvas_height - bottom_margin - (i * (available_height / 5))
+            value = int(max_bookings * (i / 5))
+            self.peak_canvas.create_text(
+                left_margin - 10, y,
+                text=str(value), fill=TEXT_COLOR, anchor="e"
+            )
+            self.peak_canvas.create_line(
+                left_margin - 5, y,
+                left_margin, y,
+                fill=TEXT_COLOR
+            )
 
-class UIManager:
+        self.peak_canvas.create_text(
+            canvas_width / 2, 15,
+            text=f"Peak Booking Hours (Last {days} Days)",
+            fill=TEXT_COLOR, font=HEADER_FONT
+        )
+
+
+
+class UIManager(AnalyticsView):
     def __init__(self, app, db):
         self.db = db
         self.app = app
         self.auth = app.auth
+        self.service = app.service
         self.current_user = None
+        self.customer_token = None
+        self.staff_token = None
+        self.analytics_worker = AnalyticsWorker(db)
+        self.analytics_worker.start()
         self.setup_styles()
 
     def setup_styles(self):
@@ -389,36 +2825,7 @@ class UIManager:
         window.mainloop()
 
     def show_database(self):
-        def sort_bookings(sort_by='date', ascending=True):
-            all_bookings = self.db.fetch_all_bookings()
-            booking_data = []
-
-            for booking in all_bookings:
-                booking_data.append((booking[0], f"{booking[1]} {booking[2]}", booking[1]))
-
-            sorted_bookings = self.db.merge_sort(
-                booking_data,
-                sortby=sort_by,
-                ascending=ascending
-            )
-
-            booking_box.delete(0, tk.END)
-            for sorted_booking in sorted_bookings:
-                full_booking = None
-                for booking in all_bookings:
-                    if booking[0] == sorted_booking[0]:
-                        full_booking = booking
-                        break
-
-                if full_booking:
-                    booking_text = (
-                        f"BookingID: {full_booking[0]}, Date: {full_booking[1]}, "
-                        f"Time: {full_booking[2]}, Customer: {full_booking[3]}, "
-                        f"Haircut: {full_booking[4]}, Locked: {full_booking[5]}"
-                    )
-                    booking_box.insert(tk.END, booking_text)
-        if self.staff_login():
-            data = self.db.fetch_all_data()
+        if self.require_staff():
             window = self.create_window("Database Contents", "1200x800")
 
             notebook = ttk.Notebook(window)
@@ -427,123 +2834,28 @@ class UIManager:
             cust_frame = ttk.Frame(notebook)
             notebook.add(cust_frame, text="Customers")
 
-            customer_list = tk.Listbox(cust_frame, width=120, height=30, font=FONT)
-            customer_list.pack(side='left', fill='both', expand=True, padx=10, pady=10)
-
-            scroll_cust = ttk.Scrollbar(cust_frame, orient='vertical', command=customer_list.yview)
-            scroll_cust.pack(side='right', fill='y')
-            customer_list.config(yscrollcommand=scroll_cust.set)
+            VirtualList(cust_frame, TablePager(self.db, "Customer"), format_customer)
 
             haircut_frame = ttk.Frame(notebook)
             notebook.add(haircut_frame, text="Haircuts")
 
-            haircut_box = tk.Listbox(haircut_frame, width=120, height=30, font=FONT)
-            haircut_box.pack(side='left', fill='both', expand=True, padx=10, pady=10)
-
-            scroll_hair = ttk.Scrollbar(haircut_frame, orient='vertical', command=haircut_box.yview)
-            scroll_hair.pack(side='right', fill='y')
-            haircut_box.config(yscrollcommand=scroll_hair.set)
+            VirtualList(haircut_frame, TablePager(self.db, "Haircut"), format_haircut)
 
             booking_frame = ttk.Frame(notebook)
             notebook.add(booking_frame, text="Bookings")
 
-            filter_frame = ttk.Frame(booking_frame)
-            filter_frame.pack(fill='x', pady=5)
-
-            ttk.Label(filter_frame, text="Filter by Date (YYYY-MM-DD):").pack(side='left', padx=5)
-            date_filter_entry = ttk.Entry(filter_frame, width=12)
-            date_filter_entry.pack(side='left', padx=5)
-
-            ttk.Button(filter_frame, text="Apply Filter",
-                       command=lambda: self.filter_bookings_by_date(booking_box, date_filter_entry.get())).pack(side='left',
-                                                                                                                padx=5)
-
-            ttk.Button(filter_frame, text="Clear Filter",
-                       command=lambda: self.load_all_bookings(booking_box)).pack(side='left', padx=5)
-
-            sort_frame = ttk.Frame(booking_frame)
-            sort_frame.pack(fill='x', pady=5)
-
-            ttk.Button(sort_frame, text="Sort by Date (Oldest)",
-                       command=lambda: sort_bookings('date', True)).pack(side='left', padx=5)
-
-            ttk.Button(sort_frame, text="Sort by Date (Newest)",
-                       command=lambda: sort_bookings('date', False)).pack(side='left', padx=5)
-
-            booking_box = tk.Listbox(booking_frame, width=120, height=30, font=FONT)
-            booking_box.pack(side='left', fill='both', expand=True, padx=10, pady=10)
-
-            scroll_book = ttk.Scrollbar(booking_frame, orient='vertical', command=booking_box.yview)
-            scroll_book.pack(side='right', fill='y')
-            booking_box.config(yscrollcommand=scroll_book.set)
+            BookingBrowser(booking_frame, self.db)
 
             staff_frame = ttk.Frame(notebook)
             notebook.add(staff_frame, text="Staff")
 
-            staff_box = tk.Listbox(staff_frame, width=120, height=30, font=FONT)
-            staff_box.pack(side='left', fill='both', expand=True, padx=10, pady=10)
-
-            scroll_staff = ttk.Scrollbar(staff_frame, orient='vertical', command=staff_box.yview)
-            scroll_staff.pack(side='right', fill='y')
-            staff_box.config(yscrollcommand=scroll_staff.set)
-
-            for customer in data["customers"]:
-                customer_list.insert(tk.END,
-                                     f"ID: {customer[0]}, Name: {customer[1]} {customer[2]}, "
-                                     f"Email: {customer[3]}, DOB: {customer[6]}"
-                                     )
-
-            for haircut in data["haircuts"]:
-                haircut_box.insert(tk.END,
-                                   f"ID: {haircut[0]}, Name: {haircut[1]}, "
-                                   f"Price: £{haircut[2]:.2f}, Duration: {haircut[3]}"
-                                   )
-
-            self.load_all_bookings(booking_box)
-
-            if "staff" in data:
-                for staff in data["staff"]:
-                    staff_box.insert(tk.END,
-                                     f"ID: {staff[0]}, Email: {staff[1]}, Staff Number: {staff[2]}"
-                                     )
-
-
+            VirtualList(staff_frame, TablePager(self.db, "Staff"), format_staff)
 
             btn_frame = ttk.Frame(window)
             btn_frame.pack(fill='x', pady=10)
 
             ttk.Button(btn_frame, text="Close", command=window.destroy).pack(side='right', padx=5)
 
-    def filter_bookings_by_date(self, booking_box, date_filter):
-        try:
-            datetime.strptime(date_filter, "%Y-%m-%d")
-        except ValueError:
-            messagebox.showerror("error", "Please enter in YYYY-MM-DD")
-            return
-
-        all_bookings = self.db.fetch_all_bookings()
-        booking_box.delete(0, tk.END)
-
-        found = False
-        for booking in all_bookings:
-            if booking[1] == date_filter:
-                booking_box.insert(tk.END,
-                                   f"BookingID: {booking[0]}, Date: {booking[1]}, Time: {booking[2]}, "
-                                   f"Customer: {booking[3]}, Haircut: {booking[4]}, Locked: {booking[5]}"
-                                   )
-                found = True
-
-        if not found:
-            booking_box.insert(tk.END, "No bookings found for this date")
-
-    def load_all_bookings(self, booking_box):
-        booking_box.delete(0, tk.END)
-        for booking in self.db.fetch_all_bookings():
-            booking_box.insert(tk.END,
-                               f"BookingID: {booking[0]}, Date: {booking[1]}, Time: {booking[2]}, "
-                               f"Customer: {booking[3]}, Haircut: {booking[4]}, Locked: {booking[5]}"
-                               )
-
     def register(self):
         def validate_date(date_str):
             try:
@@ -571,11 +2883,13 @@ class UIManager:
 
             salt = self.app.auth.generate_salt()
             hashed_password = self.auth.hash_password(new_password, salt)
-            self.app.db.insert_customer(surname_entry.get(), firstname_entry.get(), new_email,
-                                        hashed_password, salt, date_of_birth)
+            try:
+                self.app.db.insert_customer(surname_entry.get(), firstname_entry.get(), new_email,
+                                            hashed_password, salt, date_of_birth)
+            except sqlite3.IntegrityError:
+                messagebox.showerror("Error", "An account with this email already exists.")
+                return
 
-            self.app.auth.email.append(new_email)
-            self.app.auth.password.append(hashed_password)
             register_widget.destroy()
             self.app.main_menu()
 
@@ -612,7 +2926,9 @@ class UIManager:
 
         login = [False]
         def staff_check():
-            if self.auth.staff_check(staffID_entry.get()):
+            token = self.auth.start_staff_session(staffID_entry.get())
+            if token:
+                self.staff_token = token
                 login[0] = True
                 window.destroy()
             else:
@@ -628,6 +2944,17 @@ class UIManager:
         window.wait_window()
 
         return login[0]
+
+    def require_staff(self):
+        # only prompt for a staff ID when there is no live staff session
+        return self.auth.is_staff(self.staff_token) or self.staff_login()
+
+    def logout(self):
+        self.auth.sessions.revoke(self.customer_token)
+        self.auth.sessions.revoke(self.staff_token)
+        self.current_user = None
+        self.customer_token = self.staff_token = None
+
     def login(self):
         def attempt_login():
             email = email_entry.get()
@@ -636,8 +2963,26 @@ class UIManager:
                 messagebox.showinfo("Success", "Login successful!")
                 login_widget.destroy()
                 self.app.main_page()
+                return
+
+            login_button.config(state='disabled')
+            poll_future(login_widget, self.auth.submit_login(email, password),
+                        lambda future: login_finished(future, email))
 
-            if self.auth.login_check(email, password):
+        def login_finished(future, email):
+            if not login_widget.winfo_exists():
+                return
+            login_button.config(state='normal')
+            try:
+                token = future.result()
+            except RateLimitError as error:
+                messagebox.showerror("Error", str(error))
+                return
+            except Exception as error:
+                messagebox.showerror("Error", f"Login failed, please try again. ({error})")
+                return
+            if token:
+                self.customer_token = token
                 self.current_user = self.db.fetch_customer_email(email)
                 messagebox.showinfo("Success", "Login successful!")
                 login_widget.destroy()
@@ -661,122 +3006,46 @@ class UIManager:
         btn_frame = ttk.Frame(form_frame)
         btn_frame.grid(row=2, columnspan=2, pady=15)
 
-        ttk.Button(btn_frame, text="Login", command=attempt_login).pack(side='left', padx=5)
+        login_button = ttk.Button(btn_frame, text="Login", command=attempt_login)
+        login_button.pack(side='left', padx=5)
         ttk.Button(btn_frame, text="Back",
                    command=lambda: [login_widget.destroy(), self.app.main_menu()]).pack(side='left', padx=5)
 
     def pricing(self):
-        window = self.create_window("Pricing", "600x400")
-
-        self.db.cursor.execute("SELECT * FROM Haircut")
-        haircuts = self.db.cursor.fetchall()
-
-        tree = ttk.Treeview(window, columns=("Name", "Price", "Duration"), show="headings")
-        tree.heading("Name", text="Haircut Name")
-        tree.heading("Price", text="Price (£)")
-        tree.heading("Duration", text="Duration")
-
-        for haircut in haircuts:
-            tree.insert("", tk.END, values=(haircut[1], f"£{haircut[2]:.2f}", haircut[3]))
-
-        tree.pack(fill='both', expand=True, padx=10, pady=10)
-
-        ttk.Button(window, text="Close", command=window.destroy).pack(pady=10)
-
-    def process_booking(self, selected_time, haircut_name, card_number, card_cvc, expiry_date):
-        current_time = datetime.now().strftime("%H:%M")
-        if selected_time < current_time:
-            messagebox.showerror("Error", "Cannot book past time slots")
-            return False
-
-        if not self.validate_payment(card_number, card_cvc, expiry_date):
-            return False
-
-        try:
-            self.db.connection.execute("BEGIN TRANSACTION")
-
-            self.db.cursor.execute(
-                "SELECT HaircutID, Price, Estimated_Time FROM Haircut WHERE Haircut_Name = ?",
-                (haircut_name,)
-            )
-            haircut = self.db.cursor.fetchone()
-
-            if not haircut:
-                messagebox.showerror("Error", "Selected haircut not found")
-                self.db.connection.rollback()
-                return False
+        window = self.create_window("Pricing", "600x400")
 
-            haircut_id, price, duration = haircut
-            customer_id = self.get_current_customer_id()
-            booking_date = datetime.now().strftime("%Y-%m-%d")
-
-            self.db.cursor.execute("""
-                   SELECT 1 FROM Booking 
-                   WHERE Date = ? AND Time = ? 
-                   AND (
-                       Locked = 1
-                       OR 
-                       (ExpiryTime > datetime('now'))
-                   )
-               """, (booking_date, selected_time))
-
-            if self.db.cursor.fetchone():
-                messagebox.showerror("Error", "This time slot is no longer available")
-                self.db.connection.rollback()
-                return False
+        haircuts = self.db.fetch_all_haircuts()
 
-            expiry_time = (datetime.now() + timedelta(minutes=15)).strftime("%Y-%m-%d %H:%M:%S")
-            self.db.cursor.execute("""
-                INSERT INTO Booking (Date, Time, CustomerID, HaircutID, Locked, Duration, ExpiryTime)
-                VALUES (?, ?, ?, ?, 0, ?, ?)
-            """, (booking_date, selected_time, customer_id, haircut_id, duration, expiry_time))
-
-            payment_success = True
-
-            if payment_success:
-                self.db.cursor.execute("""
-                    UPDATE Booking 
-                    SET Locked = 1, ExpiryTime = NULL 
-                    WHERE BookingID = last_insert_rowid()
-                """)
-                self.db.connection.commit()
-
-                messagebox.showinfo(
-                    "Success",
-                    f"Booking confirmed for {selected_time}!\n"
-                    f"Service: {haircut_name} ({duration} minutes)\n"
-                    f"Amount: £{price:.2f}"
-                )
-                return True
-            else:
-                self.db.connection.rollback()
-                return False
+        tree = ttk.Treeview(window, columns=("Name", "Price", "Duration"), show="headings")
+        tree.heading("Name", text="Haircut Name")
+        tree.heading("Price", text="Price (£)")
+        tree.heading("Duration", text="Duration")
 
-        except:
-            self.db.connection.rollback()
-            messagebox.showerror("error",
-                                 "something went wrong while booking, please try again and check credentials")
-            return False
+        for haircut in haircuts:
+            tree.insert("", tk.END, values=(haircut[1], f"£{haircut[2]:.2f}", haircut[3]))
 
-    def validate_payment(self, card_number, card_cvc, expiry_date):
-        if not (card_number.isdigit() and len(card_number) >= 13):
-            messagebox.showerror("Error", "Invalid card number (must be at least 13 digits)")
-            return False
+        tree.pack(fill='both', expand=True, padx=10, pady=10)
 
-        if not (card_cvc.isdigit() and len(card_cvc) == 3):
-            messagebox.showerror("Error", "Invalid CVC (must be 3 digits)")
-            return False
+        ttk.Button(window, text="Close", command=window.destroy).pack(pady=10)
 
+    def process_booking(self, selected_time, haircut_name, card_number, card_cvc, expiry_date, booking_date=None):
         try:
-            month, year = expiry_date.split('/')
-            if not (1 <= int(month) <= 12):
-                raise ValueError
-            if int(year) < datetime.now().year % 100:
-                raise ValueError
-        except:
-            messagebox.showerror("Error", "Invalid expiry date (use MM/YY format)")
+            booking = self.service.book(self.get_current_customer_id(), booking_date, selected_time, haircut_name,
+                                        card_number, card_cvc, expiry_date)
+        except BookingError as error:
+            messagebox.showerror("Error", str(error))
+            return False
+        except sqlite3.Error:
+            messagebox.showerror("error",
+                                 "something went wrong while booking, please try again and check credentials")
             return False
 
+        messagebox.showinfo(
+            "Success",
+            f"Booking confirmed for {selected_time}!\n"
+            f"Service: {haircut_name} ({booking['duration']} minutes)\n"
+            f"Amount: £{booking['price']:.2f}"
+        )
         return True
 
     def get_current_customer_id(self):
@@ -784,11 +3053,10 @@ class UIManager:
             return self.current_user[0]
         return None
 
-    def create_booking_page(self, selected_time):
+    def create_booking_page(self, selected_time, selected_date=None):
         window = self.create_window("Confirm Booking", "500x450")
 
-        self.db.cursor.execute("SELECT Haircut_Name, Price FROM Haircut")
-        haircuts = self.db.cursor.fetchall()
+        haircuts = self.db.query("SELECT Haircut_Name, Price FROM Haircut")
 
         if not haircuts:
             ttk.Label(window, text="No services available").pack(pady=20)
@@ -799,7 +3067,7 @@ class UIManager:
         main_frame.pack(fill='both', expand=True, padx=20, pady=20)
 
         ttk.Label(main_frame,
-                  text=f"Confirm Booking for {selected_time}",
+                  text=f"Confirm Booking for {selected_date or 'today'} {selected_time}",
                   style='Header.TLabel').pack(pady=10)
 
         haircut_var = tk.StringVar(value=haircuts[0][0])
@@ -829,7 +3097,8 @@ class UIManager:
                     selected_haircut,
                     card_entry.get(),
                     cvc_entry.get(),
-                    expiry_entry.get()
+                    expiry_entry.get(),
+                    selected_date
             ):
                 window.destroy()
                 self.main_menu()
@@ -837,7 +3106,7 @@ class UIManager:
         ttk.Button(main_frame, text="Confirm Booking", command=on_confirm).pack(pady=15)
 
     def analytics(self):
-        if self.staff_login():
+        if self.require_staff():
             window = self.create_window("Analytics Dashboard", "1200x800")
             window.grid_columnconfigure(0, weight=1)
             window.grid_columnconfigure(1, weight=1)
@@ -893,187 +3162,13 @@ class UIManager:
             ttk.Button(control_frame, text="Refresh",
                        command=lambda: self.refresh_analytics()).pack(side="left", padx=10)
 
-            self.days_var.set("30")
-            self.refresh_analytics()
-
+            self.days_var.trace_add("write", self.days_changed)
             self.refresh_analytics()
-
-    def refresh_analytics(self):
-        try:
-            days = int(self.days_var.get())
-        except ValueError:
-            days = 30
-            self.days_var.set("30")
-
-        bookings = self.db.fetch_all_bookings()
-        booking_data = []
-
-        for b in bookings:
-            booking_data.append((b[0], f"{b[1]} {b[2]}", b[1]))
-
-        sorted_bookings = self.db.merge_sort(
-            booking_data,
-            sortby='date',
-            ascending=False
-        )
-
-        for item in self.revenue_tree.get_children():
-            self.revenue_tree.delete(item)
-
-        revenue_data = self.db.get_revenue_breakdown(days)
-
-        for row in revenue_data:
-            self.revenue_tree.insert("", "end", values=row)
-
-        self.popularity_text.config(state="normal")
-        self.popularity_text.delete(1.0, "end")
-
-        popularity_data = self.db.get_popular_haircuts(days)
-        total = 1
-
-        if popularity_data:
-            total = 0
-            for item in popularity_data:
-                total += item[1]
-
-        for haircut, count in popularity_data:
-            percentage = (count / total) * 100
-            bar_length = int(percentage / 5)
-            bar = "■" * bar_length
-
-            max_count = max(item[1] for item in popularity_data)
-            if count == max_count:
-                style = "bold"
-            else:
-                style = "normal"
-
-            text_line = f"{haircut.ljust(15)} {bar} {percentage:.1f}% ({count} bookings)\n"
-            self.popularity_text.insert("end", text_line, style)
-
-        self.popularity_text.tag_config("bold", font=(FONT[0], FONT[1], "bold"))
-        self.popularity_text.config(state="disabled")
-
-        for item in self.loyalty_tree.get_children():
-            self.loyalty_tree.delete(item)
-
-        loyalty_data = self.db.get_loyal_customers(3)
-
-        for row in loyalty_data:
-            self.loyalty_tree.insert("", "end", values=row[:3])
-        try:
-            days = int(self.days_var.get())
-        except ValueError:
-            days = 30
-            self.days_var.set("30")
-
-        self.refresh_peak_hours(days)
-
-        for item in self.revenue_tree.get_children():
-            self.revenue_tree.delete(item)
-        revenue_data = self.db.get_revenue_breakdown(days)
-        for row in revenue_data:
-            self.revenue_tree.insert("", "end", values=row)
-
-        self.popularity_text.config(state="normal")
-        self.popularity_text.delete(1.0, "end")
-        popularity_data = self.db.get_popular_haircuts(days)
-        total = sum(item[1] for item in popularity_data) if popularity_data else 1
-
-        for haircut, count in popularity_data:
-            percentage = (count / total) * 100
-            bar = "■" * int(percentage / 5)
-            self.popularity_text.insert("end",
-                                        f"{haircut.ljust(15)} {bar} {percentage:.1f}% ({count} bookings)\n",
-                                        ("bold" if count == max(item[1] for item in popularity_data) else "normal"))
-
-        self.popularity_text.tag_config("bold", font=(FONT[0], FONT[1], "bold"))
-        self.popularity_text.config(state="disabled")
-
-        for item in self.loyalty_tree.get_children():
-            self.loyalty_tree.delete(item)
-        loyalty_data = self.db.get_loyal_customers(3)
-        for row in loyalty_data:
-            self.loyalty_tree.insert("", "end", values=row[:3])
-
-    def refresh_peak_hours(self, days):
-        self.peak_canvas.delete("all")
-        peak_data = self.db.get_peak_hours(days)
-
-        if not peak_data:
-            self.peak_canvas.create_text(300, 150, text="No booking data", fill=TEXT_COLOR)
-            return
-
-        canvas_width = 600
-        canvas_height = 300
-
-        max_bookings = max(item[1] for item in peak_data)
-        left_margin = 50
-        right_margin = 30
-        bottom_margin = 40
-        top_margin = 20
-        available_width = canvas_width - left_margin - right_margin
-        available_height = canvas_height - bottom_margin - top_margin
-
-        num_bars = len(peak_data)
-        bar_width = min(30, available_width / num_bars - 5)
-        gap = (available_width - (num_bars * bar_width)) / (num_bars + 1)
-
-        self.peak_canvas.create_line(
-            left_margin, canvas_height - bottom_margin,
-                         canvas_width - right_margin, canvas_height - bottom_margin,
-            width=2
-        )
-        self.peak_canvas.create_line(
-            left_margin, canvas_height - bottom_margin,
-            left_margin, top_margin,
-            width=2
-        )
-
-        for i, (hour, bookings) in enumerate(peak_data):
-            x0 = left_margin + gap + i * (bar_width + gap)
-            y0 = canvas_height - bottom_margin
-            bar_height = (bookings / max_bookings) * available_height if max_bookings > 0 else 0
-            y1 = y0 - bar_height
-
-            self.peak_canvas.create_rectangle(
-                x0, y1, x0 + bar_width, y0,
-                fill=SECONDARY_COLOR, outline=PRIMARY_COLOR, width=1
-            )
-            self.peak_canvas.create_rectangle(
-                x0 + 2, y1 + 2, x0 + bar_width + 2, y0 + 2,
-                fill=SECONDARY_COLOR, outline="", width=0
-            )
-
-            hour_label = self.peak_canvas.create_text(
-                x0 + bar_width / 2, y0 + 10,
-                text=hour, fill=TEXT_COLOR, angle=45, anchor="n"
-            )
-
-            self.peak_canvas.create_text(
-                x0 + bar_width / 2, y1 - 10,
-                text=str(bookings), fill=PRIMARY_COLOR, font=(FONT[0], FONT[1], "bold")
-            )
-
-        for i in range(0, 6):
-            y = canvas_height - bottom_margin - (i * (available_height / 5))
-            value = int(max_bookings * (i / 5))
-            self.peak_canvas.create_text(
-                left_margin - 10, y,
-                text=str(value), fill=TEXT_COLOR, anchor="e"
-            )
-            self.peak_canvas.create_line(
-                left_margin - 5, y,
-                left_margin, y,
-                fill=TEXT_COLOR
-            )
-
-        self.peak_canvas.create_text(
-            canvas_width / 2, 15,
-            text=f"Peak Booking Hours (Last {days} Days)",
-            fill=TEXT_COLOR, font=HEADER_FONT
-        )
+            self.poll_analytics(window)
 
     def bookings(self):
+        chosen_date = [None]
+
         def on_date_select():
             selected_year = year_spinbox.get()
             selected_month = month_spinbox.get().zfill(2)
@@ -1081,15 +3176,9 @@ class UIManager:
             selected_date = f"{selected_year}-{selected_month}-{selected_day}"
 
             try:
-                self.db.cursor.execute("""
-                            SELECT Time FROM Booking 
-                            WHERE Date = ? 
-                            AND (Locked = 1 OR (ExpiryTime > datetime('now')))
-                        """, (selected_date,))
-
-                unavailable_times = [row[0] for row in self.db.cursor.fetchall()]
-                all_slots = [f"{hour:02d}:00" for hour in range(9, 18)]
-                available_slots = [slot for slot in all_slots if slot not in unavailable_times]
+                datetime.strptime(selected_date, "%Y-%m-%d")
+                available_slots = self.db.get_available_slots(selected_date)
+                chosen_date[0] = selected_date
 
                 time_listbox.delete(0, tk.END)
                 for time in available_slots:
@@ -1150,7 +3239,7 @@ class UIManager:
         ttk.Button(btn_frame, text="Select",
                    command=lambda: [
                        (time_selected := select_time()) and
-                       [window.destroy(), self.create_booking_page(time_selected)]
+                       [window.destroy(), self.create_booking_page(time_selected, chosen_date[0])]
                    ]).pack(side='left', padx=5)
 
         ttk.Button(btn_frame, text="Back",
@@ -1164,18 +3253,32 @@ class BarberApp:
         self.root.withdraw()
         self.db = DatabaseManager()
         self.auth = AuthManager(self.db)
+        self.service = BookingService(self.db, self.auth)
         self.ui = UIManager(self, self.db)
         self.db.remove_expired_bookings()
         self.schedule_cleanup()
 
     def schedule_cleanup(self):
-        def cleanup():
-            expired = self.db.remove_expired_bookings()
-            if expired:
-                print(f"Cleaned up {expired} expired bookings")
-            self.root.after(30000, cleanup)
-
-        self.root.after(30000, cleanup)
+        self.maintenance = MaintenanceScheduler(self.db.pool.path)
+        self.maintenance.watch_holds(self.db.holds)
+        if self.db.use_numpy():
+            self.maintenance.add_job("snapshot", SNAPSHOT_INTERVAL, export_snapshot)
+        self.maintenance.start()
+        self.root.after(500, self.check_maintenance)
+
+    def check_maintenance(self):
+        while True:
+            try:
+                name, result = self.maintenance.results.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(result, Exception):
+                print(f"Maintenance job {name} failed: {result}")
+            elif name == "expired_holds":
+                for booking_id in result:
+                    self.db.availability.remove_booking(booking_id)
+                print(f"Released {len(result)} expired holds")
+        self.root.after(500, self.check_maintenance)
 
     def main_menu(self):
         self.ui.main_menu()
@@ -1222,6 +3325,248 @@ class BookingManager:
         return f"Booking successful for {time} on {date}."
 
 
+def format_customer(customer):
+    return f"ID: {customer[0]}, Name: {customer[1]} {customer[2]}, Email: {customer[3]}, DOB: {customer[6]}"
+
+
+def format_haircut(haircut):
+    return f"ID: {haircut[0]}, Name: {haircut[1]}, Price: £{haircut[2]:.2f}, Duration: {haircut[3]}"
+
+
+def format_booking(booking):
+    return (f"BookingID: {booking[0]}, Date: {booking[1]}, Time: {booking[2]}, "
+            f"Customer: {booking[3]}, Haircut: {booking[4]}, Locked: {booking[5]}")
+
+
+def format_staff(staff):
+    return f"ID: {staff[0]}, Email: {staff[1]}, Staff Number: {staff[2]}"
+
+
+class RowPage:
+    # one cached page of a VirtualList: display text, the primary key of each row (every table
+    # here has it in column 0) and the cursor a keyset seek for the next page starts from
+    __slots__ = ("texts", "keys", "last")
+
+    def __init__(self, rows, format_row, cursor):
+        self.texts = [format_row(row) for row in rows]
+        self.keys = array("q", (row[0] for row in rows))
+        self.last = cursor(rows[-1]) if rows else None
+
+    def __len__(self):
+        return len(self.keys)
+
+
+class VirtualList:
+    # a Listbox that only ever holds the rows in view. The scrollbar is driven by the row count,
+    # rows are fetched a page at a time from source.page() and the formatted pages are kept in
+    # a small LRU, so scrolling back over recent rows never touches the database
+    def __init__(self, parent, source, format_row, page_size=VIRTUAL_PAGE_SIZE,
+                 cached_pages=VIRTUAL_CACHED_PAGES, height=30, empty_text="No rows found", selectmode="browse"):
+        self.source = source
+        self.format_row = format_row
+        self.page_size = page_size
+        self.cached_pages = cached_pages
+        self.empty_text = empty_text
+        self.pages = OrderedDict()
+        self.total = 0
+        self.top = 0
+        self.visible = height
+        self.selection = set()
+        self.line_height = tkfont.Font(font=FONT).metrics("linespace")
+
+        self.listbox = tk.Listbox(parent, width=120, height=height, font=FONT, exportselection=False,
+                                  selectmode=selectmode)
+        self.listbox.pack(side='left', fill='both', expand=True, padx=10, pady=10)
+
+        self.scrollbar = ttk.Scrollbar(parent, orient='vertical', command=self.scroll)
+        self.scrollbar.pack(side='right', fill='y')
+
+        self.listbox.bind("<<ListboxSelect>>", self.selected)
+        self.listbox.bind("<Configure>", self.resized)
+        self.listbox.bind("<MouseWheel>", self.wheel)
+        self.listbox.bind("<Button-4>", self.wheel)
+        self.listbox.bind("<Button-5>", self.wheel)
+
+        self.refresh()
+
+    def page(self, number):
+        if number in self.pages:
+            self.pages.move_to_end(number)
+            return self.pages[number]
+        # the page before is usually still cached while scrolling down, which lets the source seek
+        # from its last row instead of counting past every row above
+        previous = self.pages.get(number - 1)
+        rows = self.source.page(number, self.page_size, previous.last if previous else None)
+        page = RowPage(rows, self.format_row, self.source.cursor)
+        self.pages[number] = page
+        while len(self.pages) > self.cached_pages:
+            self.pages.popitem(last=False)
+        return page
+
+    def draw(self):
+        self.listbox.delete(0, tk.END)
+        if not self.total:
+            self.listbox.insert(tk.END, self.empty_text)
+            self.scrollbar.set(0, 1)
+            return
+        end = min(self.total, self.top + self.visible)
+        texts = []
+        for number in range(self.top // self.page_size, (end - 1) // self.page_size + 1):
+            start = number * self.page_size
+            texts.extend(self.page(number).texts[max(self.top - start, 0):end - start])
+        self.listbox.insert(tk.END, *texts)
+        for index in self.selection:
+            if self.top <= index < end:
+                self.listbox.selection_set(index - self.top)
+        self.scrollbar.set(self.top / self.total, end / self.total)
+
+    def scroll(self, action, amount, unit=None):
+        if action == "moveto":
+            top = int(float(amount) * self.total)
+        elif unit == "pages":
+            top = self.top + int(amount) * self.visible
+        else:
+            top = self.top + int(amount)
+        top = max(0, min(top, self.total - self.visible))
+        if top != self.top:
+            self.top = top
+            self.draw()
+
+    def wheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self.scroll("scroll", -3, "units")
+        else:
+            self.scroll("scroll", 3, "units")
+        return "break"
+
+    def resized(self, event):
+        visible = max(1, event.height // self.line_height)
+        if visible != self.visible:
+            self.visible = visible
+            self.top = max(0, min(self.top, self.total - self.visible))
+            self.draw()
+
+    def selected(self, event):
+        if not self.total:
+            return
+        shown = {self.top + index for index in self.listbox.curselection()}
+        if self.listbox.cget("selectmode") in ("browse", "single"):
+            self.selection = shown
+        else:
+            self.selection = {index for index in self.selection
+                              if not self.top <= index < self.top + self.visible} | shown
+
+    def refresh(self):
+        self.pages.clear()
+        self.selection.clear()
+        self.total = self.source.count()
+        self.top = max(0, min(self.top, self.total - self.visible))
+        self.draw()
+
+    # Listbox-style access by absolute row index
+    def curselection(self):
+        return tuple(sorted(self.selection))
+
+    def get(self, index):
+        page = self.page(index // self.page_size)
+        return page.texts[index % self.page_size]
+
+    def key(self, index):
+        page = self.page(index // self.page_size)
+        return page.keys[index % self.page_size]
+
+    def selected_keys(self):
+        return [self.key(index) for index in self.curselection()]
+
+
+class BookingBrowser:
+    # the Bookings tab: filters and sort buttons over a VirtualList of bookings
+    def __init__(self, parent, db, selectmode="browse"):
+        self.db = db
+        self.pager = BookingPager(db)
+        self.haircut_ids = {"All services": None}
+        for haircut in db.fetch_all_haircuts():
+            self.haircut_ids[haircut[1]] = haircut[0]
+
+        filter_frame = ttk.Frame(parent)
+        filter_frame.pack(fill='x', pady=5)
+
+        ttk.Label(filter_frame, text="From (YYYY-MM-DD):").pack(side='left', padx=5)
+        self.date_from_entry = ttk.Entry(filter_frame, width=12)
+        self.date_from_entry.pack(side='left', padx=5)
+
+        ttk.Label(filter_frame, text="To:").pack(side='left', padx=5)
+        self.date_to_entry = ttk.Entry(filter_frame, width=12)
+        self.date_to_entry.pack(side='left', padx=5)
+
+        ttk.Label(filter_frame, text="Customer ID:").pack(side='left', padx=5)
+        self.customer_entry = ttk.Entry(filter_frame, width=8)
+        self.customer_entry.pack(side='left', padx=5)
+
+        self.service_var = tk.StringVar(value="All services")
+        ttk.Combobox(filter_frame, textvariable=self.service_var, values=list(self.haircut_ids),
+                     state="readonly", width=15).pack(side='left', padx=5)
+
+        ttk.Button(filter_frame, text="Apply Filter", command=self.apply_filter).pack(side='left', padx=5)
+        ttk.Button(filter_frame, text="Clear Filter", command=self.clear_filter).pack(side='left', padx=5)
+
+        sort_frame = ttk.Frame(parent)
+        sort_frame.pack(fill='x', pady=5)
+
+        ttk.Button(sort_frame, text="Sort by Date (Oldest)",
+                   command=lambda: self.sort('date', True)).pack(side='left', padx=5)
+
+        ttk.Button(sort_frame, text="Sort by Date (Newest)",
+                   command=lambda: self.sort('date', False)).pack(side='left', padx=5)
+
+        self.count_label = ttk.Label(sort_frame, text="")
+        self.count_label.pack(side='right', padx=5)
+
+        self.booking_box = VirtualList(parent, self.pager, format_booking, empty_text="No bookings found",
+                                       selectmode=selectmode)
+        self.show_count()
+
+    def apply_filter(self):
+        date_from = self.date_from_entry.get().strip()
+        date_to = self.date_to_entry.get().strip()
+        for date_filter in (date_from, date_to):
+            if date_filter:
+                try:
+                    datetime.strptime(date_filter, "%Y-%m-%d")
+                except ValueError:
+                    messagebox.showerror("error", "Please enter in YYYY-MM-DD")
+                    return
+
+        customer = self.customer_entry.get().strip()
+        if customer and not customer.isdigit():
+            messagebox.showerror("error", "Customer ID must be a number")
+            return
+
+        self.pager.filter(date_from=date_from, date_to=date_to,
+                          customerID=int(customer) if customer else None,
+                          haircutID=self.haircut_ids.get(self.service_var.get()))
+        self.reload()
+
+    def clear_filter(self):
+        for entry in (self.date_from_entry, self.date_to_entry, self.customer_entry):
+            entry.delete(0, tk.END)
+        self.service_var.set("All services")
+        self.pager.filter()
+        self.reload()
+
+    def sort(self, order, ascending):
+        self.pager.sort(order, ascending)
+        self.reload()
+
+    def reload(self):
+        self.booking_box.top = 0
+        self.booking_box.refresh()
+        self.show_count()
+
+    def show_count(self):
+        self.count_label.config(text=f"{self.booking_box.total} bookings")
+
+
 class BaseWindow:
     def __init__(self):
         self.window = tk.Toplevel()
@@ -1283,7 +3628,7 @@ class MainPageWindow(BaseWindow):
                    command=self.ui.analytics).grid(row=1, column=1, padx=10, pady=10)
 
         ttk.Button(self.window, text="Logout",
-                   command=lambda: [self.close(), self.app.main_menu()]).pack(side='bottom', pady=20)
+                   command=lambda: [self.close(), self.ui.logout(), self.app.main_menu()]).pack(side='bottom', pady=20)
 
 class LoginWindow(BaseWindow):
     def __init__(self, app, auth):
@@ -1307,14 +3652,31 @@ class LoginWindow(BaseWindow):
         self.password_entry = ttk.Entry(frame, show="*")
         self.password_entry.grid(row=1, column=1)
 
-        ttk.Button(frame, text="Login", command=self.attempt_login).grid(row=2, column=0)
+        self.login_button = ttk.Button(frame, text="Login", command=self.attempt_login)
+        self.login_button.grid(row=2, column=0)
         ttk.Button(frame, text="Back", command=self.back).grid(row=2, column=1)
 
     def attempt_login(self):
         email = self.email_entry.get()
         password = self.password_entry.get()
 
-        if self.auth.login_check(email, password):
+        self.login_button.config(state='disabled')
+        poll_future(self.window, self.auth.submit_login(email, password), self.login_finished)
+
+    def login_finished(self, future):
+        if not self.window.winfo_exists():
+            return
+        self.login_button.config(state='normal')
+        try:
+            token = future.result()
+        except RateLimitError as error:
+            messagebox.showerror("Error", str(error))
+            return
+        except Exception as error:
+            messagebox.showerror("Error", f"Login failed, please try again. ({error})")
+            return
+        if token:
+            self.app.ui.customer_token = token
             messagebox.showinfo("Success", "Login successful!")
             self.close()
             self.app.main_page()
@@ -1378,10 +3740,12 @@ class RegisterWindow(BaseWindow):
 
         salt = self.auth.generate_salt()
         hashed_password = self.auth.hash_password(password, salt=salt)
-        self.db.insert_customer(surname, firstname, email, hashed_password, salt, dob)
+        try:
+            self.db.insert_customer(surname, firstname, email, hashed_password, salt, dob)
+        except sqlite3.IntegrityError:
+            messagebox.showerror("Error", "An account with this email already exists.")
+            return
 
-        self.auth.email.append(email)
-        self.auth.password.append(hashed_password)
         self.close()
         self.app.main_menu()
 
@@ -1397,6 +3761,7 @@ class BookingWindow(BaseWindow):
         self.db = db
         self.window.title("Book an Appointment")
         self.window.geometry("600x500")
+        self.selected_date = None
         self.setup_ui()
 
     def setup_ui(self):
@@ -1447,6 +3812,7 @@ class BookingWindow(BaseWindow):
     def on_date_select(self):
         selected_date = f"{self.year_spinbox.get()}-{self.month_spinbox.get().zfill(2)}-{self.day_spinbox.get().zfill(2)}"
         available_slots = self.db.get_available_slots(selected_date)
+        self.selected_date = selected_date
 
         self.time_listbox.delete(0, tk.END)
         for slot in available_slots:
@@ -1459,7 +3825,7 @@ class BookingWindow(BaseWindow):
             return
         time_selected = self.time_listbox.get(selected[0])
         self.close()
-        self.ui.create_booking_page(time_selected)
+        self.ui.create_booking_page(time_selected, self.selected_date)
 
     def back(self):
         self.close()
@@ -1474,8 +3840,7 @@ class PricingWindow(BaseWindow):
         self.setup_ui()
 
     def setup_ui(self):
-        self.db.cursor.execute("SELECT * FROM Haircut")
-        haircuts = self.db.cursor.fetchall()
+        haircuts = self.db.fetch_all_haircuts()
 
         tree = ttk.Treeview(self.window, columns=("Name", "Price", "Duration"), show="headings")
         tree.heading("Name", text="Haircut Name")
@@ -1489,150 +3854,77 @@ class PricingWindow(BaseWindow):
         ttk.Button(self.window, text="Close", command=self.close).pack(pady=10)
 
 class DatabaseWindow(BaseWindow):
-    def __init__(self, db):
+    def __init__(self, db, auth, token):
         super().__init__()
         self.db = db
+        self.auth = auth
+        self.token = token
         self.window.title("Database Contents")
         self.window.geometry("1200x800")
         self.setup_ui()
         self.current_tab = None
 
     def remove(self):
+        if not self.auth.is_staff(self.token):
+            messagebox.showerror("Error", "Your staff session has expired, please log in again.")
+            self.close()
+            return
         current_tab = self.tabs.tab(self.tabs.select(), "text")
-        if current_tab == "Customers":
-            selected_customer = self.customer_list.curselection()
-            if not selected_customer:
-                messagebox.showerror("Error", "Select a customer")
-                return
-            selected_customer_info = self.customer_list.get(selected_customer[0])
-
-            CustomerID = re.search(r"ID: (\d+)", selected_customer_info)  # extracts ID
-            try:
-                if CustomerID:
-                    CustomerID = int(CustomerID.group(1))  # gets rid of "ID:"
-                    self.db.remove_customer(CustomerID)
-                    messagebox.showinfo("Success", f"Customer ID {CustomerID} removed successfully.")
-                    self.customer_list.delete(selected_customer[0])
-            except:
-                messagebox.showerror("Error", "Customer ID could not be extracted.")
-        if current_tab == "Haircuts":
-            selected_haircut = self.haircut_box.curselection()
-            if not selected_haircut:
-                messagebox.showerror("Error", "Select a haircut")
-                return
-            selected_haircut_info = self.haircut_box.get(selected_haircut[0])
-
-            HaircutID = re.search(r"ID: (\d+)", selected_haircut_info)
-            try:
-                if HaircutID:
-                    HaircutID = int(HaircutID.group(1))
-                    self.db.remove_haircut(HaircutID)
-                    messagebox.showinfo("Success", f"Haircut ID {HaircutID} removed successfully.")
-                    self.haircut_box.delete(selected_haircut[0])
-            except:
-                messagebox.showerror("Error", "Haircut ID could not be extracted.")
-
-        if current_tab == "Bookings":
-            selected_booking = self.booking_box.curselection()
-            if not selected_booking:
-                messagebox.showerror("Error", "Select a booking")
-                return
-            selected_booking_info = self.booking_box.get(selected_booking[0])
+        rows, remove_rows, name = {
+            "Customers": (self.customer_list, self.db.remove_customers, "Customer"),
+            "Haircuts": (self.haircut_box, self.db.remove_haircuts, "Haircut"),
+            "Bookings": (self.booking_box, self.db.remove_bookings, "Booking"),
+            "Staff": (self.staff_box, self.db.remove_staff_members, "Staff"),
+        }[current_tab]
+
+        keys = rows.selected_keys()
+        if not keys:
+            messagebox.showerror("Error", f"Select a {name.lower()}")
+            return
+        if len(keys) > 1 and not messagebox.askyesno("Confirm", f"Remove {len(keys)} {name.lower()} records?"):
+            return
 
-            BookingID = re.search(r"ID: (\d+)", selected_booking_info)
-            try:
-                if BookingID:
-                    BookingID = int(BookingID.group(1))
-                    self.db.remove_booking(BookingID)
-                    messagebox.showinfo("Success", f"Booking ID {BookingID} removed successfully.")
-                    self.booking_box.delete(selected_booking[0])
-            except:
-                messagebox.showerror("Error", "Booking ID could not be extracted.")
-        if current_tab == "Staff":
-            selected_staff = self.staff_box.curselection()
-            if not selected_staff:
-                messagebox.showerror("Error", "Select a staff")
-                return
-            selected_staff_info = self.staff_box.get(selected_staff[0])
+        try:
+            remove_rows(keys)
+        except sqlite3.Error as error:
+            messagebox.showerror("Error", f"Could not remove: {error}")
+            return
 
-            StaffID = re.search(r"ID: (\d+)", selected_staff_info)
-            try:
-                if StaffID:
-                    StaffID = int(StaffID.group(1))
-                    self.db.remove_staff(StaffID)
-                    messagebox.showinfo("Success", f"Staff ID {StaffID} removed successfully.")
-                    self.staff_box.delete(selected_staff[0])
-            except:
-                messagebox.showerror("Error", "Staff ID could not be extracted.")
+        if len(keys) == 1:
+            messagebox.showinfo("Success", f"{name} ID {keys[0]} removed successfully.")
+        else:
+            messagebox.showinfo("Success", f"{len(keys)} {name.lower()} records removed successfully.")
+        rows.refresh()
+        if rows is self.booking_box:
+            self.booking_browser.show_count()
 
     def setup_ui(self):
-        data = self.db.fetch_all_data()
         self.tabs = ttk.Notebook(self.window)
         self.tabs.pack(fill='both', expand=True)
 
         cust_frame = ttk.Frame(self.tabs)
         self.tabs.add(cust_frame, text="Customers")
 
-        self.customer_list = tk.Listbox(cust_frame, width=120, height=30, font=FONT)
-        self.customer_list.pack(side='left', fill='both', expand=True, padx=10, pady=10)
-
-        scroll_cust = ttk.Scrollbar(cust_frame, orient='vertical', command=self.customer_list.yview)
-        scroll_cust.pack(side='right', fill='y')
-        self.customer_list.config(yscrollcommand=scroll_cust.set)
+        self.customer_list = VirtualList(cust_frame, TablePager(self.db, "Customer"), format_customer,
+                                         selectmode="extended")
 
         haircut_frame = ttk.Frame(self.tabs)
         self.tabs.add(haircut_frame, text="Haircuts")
 
-        self.haircut_box = tk.Listbox(haircut_frame, width=120, height=30, font=FONT)
-        self.haircut_box.pack(side='left', fill='both', expand=True, padx=10, pady=10)
-
-        scroll_hair = ttk.Scrollbar(haircut_frame, orient='vertical', command=self.haircut_box.yview)
-        scroll_hair.pack(side='right', fill='y')
-        self.haircut_box.config(yscrollcommand=scroll_hair.set)
+        self.haircut_box = VirtualList(haircut_frame, TablePager(self.db, "Haircut"), format_haircut,
+                                       selectmode="extended")
 
         booking_frame = ttk.Frame(self.tabs)
         self.tabs.add(booking_frame, text="Bookings")
 
-        self.booking_box = tk.Listbox(booking_frame, width=120, height=30, font=FONT)
-        self.booking_box.pack(side='left', fill='both', expand=True, padx=10, pady=10)
-
-        scroll_book = ttk.Scrollbar(booking_frame, orient='vertical', command=self.booking_box.yview)
-        scroll_book.pack(side='right', fill='y')
-        self.booking_box.config(yscrollcommand=scroll_book.set)
+        self.booking_browser = BookingBrowser(booking_frame, self.db, selectmode="extended")
+        self.booking_box = self.booking_browser.booking_box
 
         staff_frame = ttk.Frame(self.tabs)
         self.tabs.add(staff_frame, text="Staff")
 
-        self.staff_box = tk.Listbox(staff_frame, width=120, height=30, font=FONT)
-        self.staff_box.pack(side='left', fill='both', expand=True, padx=10, pady=10)
-
-        scroll_staff = ttk.Scrollbar(staff_frame, orient='vertical', command=self.staff_box.yview)
-        scroll_staff.pack(side='right', fill='y')
-        self.staff_box.config(yscrollcommand=scroll_staff.set)
-
-        for customer in data["customers"]:
-            self.customer_list.insert(tk.END,
-                                 f"ID: {customer[0]}, Name: {customer[1]} {customer[2]}, "
-                                 f"Email: {customer[3]}, DOB: {customer[6]}"
-                                 )
-
-        for haircut in data["haircuts"]:
-            self.haircut_box.insert(tk.END,
-                               f"ID: {haircut[0]}, Name: {haircut[1]}, "
-                               f"Price: £{haircut[2]:.2f}, Duration: {haircut[3]}"
-                               )
-
-        for booking in data["bookings"]:
-            self.booking_box.insert(tk.END,
-                               f"BookingID: {booking[0]}, Date: {booking[1]}, Time: {booking[2]}, "
-                               f"Customer: {booking[3]}, Haircut: {booking[4]}, Locked: {booking[5]}"
-                               )
-
-        if "staff" in data:
-            for staff in data["staff"]:
-                self.staff_box.insert(tk.END,
-                                 f"ID: {staff[0]}, Email: {staff[1]}, Staff Number: {staff[2]}"
-                                 )
+        self.staff_box = VirtualList(staff_frame, TablePager(self.db, "Staff"), format_staff,
+                                     selectmode="extended")
 
         btn_frame = ttk.Frame(self.window)
         btn_frame.pack(fill='x', pady=10)
@@ -1643,10 +3935,11 @@ class DatabaseWindow(BaseWindow):
         ttk.Button(btn_frame, text="Close", command=self.close).pack(side='right', padx=5)
         ttk.Button(btn_frame, text="Remove", command=self.remove).pack(side='left', padx=5)
 
-class AnalyticsWindow(BaseWindow):
+class AnalyticsWindow(BaseWindow, AnalyticsView):
     def __init__(self, ui):
         super().__init__()
         self.ui = ui
+        self.analytics_worker = ui.analytics_worker
         self.window.title("Analytics Dashboard")
         self.window.geometry("1200x800")
         self.setup_ui()
@@ -1704,18 +3997,32 @@ class AnalyticsWindow(BaseWindow):
         days_combo.pack(side="left", padx=5)
 
         ttk.Button(control_frame, text="Refresh",
-                   command=lambda: self.ui.refresh_analytics()).pack(side="left", padx=10)
+                   command=self.refresh_analytics).pack(side="left", padx=10)
 
-        self.ui.days_var.set("30")
-        self.ui.refresh_analytics()
+        self.days_var.trace_add("write", self.days_changed)
+        self.refresh_analytics()
+        self.poll_analytics(self.window)
 
     def refresh_analytics(self):
-        self.ui.refresh_analytics()
+        if not self.ui.auth.is_staff(self.ui.staff_token):
+            messagebox.showerror("Error", "Your staff session has expired, please log in again.")
+            self.close()
+            return
+        super().refresh_analytics()
 
 
 
 
 
 if __name__ == "__main__":
-    app = BarberApp()
-    app.main_menu()
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        run_service(port=int(sys.argv[2]) if len(sys.argv) > 2 else SERVICE_PORT)
+    elif len(sys.argv) > 1 and sys.argv[1] == "serve-async":
+        run_async_service(port=int(sys.argv[2]) if len(sys.argv) > 2 else SERVICE_PORT)
+    elif len(sys.argv) > 1 and sys.argv[1] == "export-snapshot":
+        print(f"Exported {export_snapshot(connect_database(readonly=True))} bookings to {SNAPSHOT_PATH}")
+    elif len(sys.argv) > 1 and sys.argv[1] == "calibrate-hash":
+        run_calibration(float(sys.argv[2]) if len(sys.argv) > 2 else HASH_TARGET_MS)
+    else:
+        app = BarberApp()
+        app.main_menu()
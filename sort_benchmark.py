@@ -0,0 +1,112 @@
+import random
+import sys
+from datetime import datetime, timedelta
+from time import perf_counter
+
+
+def sort_value(value):
+    # one comparable key per value: None first, then numbers (digit strings included), then text;
+    # ISO dates and HH:MM times already sort correctly as text
+    if value is None:
+        return 0, 0
+    if isinstance(value, (int, float)):
+        return 1, value
+    if isinstance(value, str) and value.isdigit():
+        return 1, int(value)
+    return 2, str(value)
+
+
+def sort_records(records, *keys):
+    # keys are (column, ascending) pairs, column being an index or a function of the record;
+    # each column's keys are built once, then stable sorts run from the last key to the first
+    records = list(records)
+    order = list(range(len(records)))
+    for column, ascending in reversed(keys or [(0, True)]):
+        extract = column if callable(column) else (lambda record, index=column: record[index])
+        values = [sort_value(extract(record)) for record in records]
+        order.sort(key=values.__getitem__, reverse=not ascending)
+    return [records[index] for index in order]
+
+
+# the sort the booking list used before sort_records, kept as the baseline
+def recursive_merge_sort(records, sortby='id', ascending=True):
+    fields = ['id', 'name', 'date']
+
+    try:
+        sort_index = fields.index(sortby)
+    except ValueError:
+        sort_index = 0
+
+    if len(records) <= 1:
+        return records
+
+    mid = len(records) // 2
+    leftlist = recursive_merge_sort(records[:mid], sortby, ascending)
+    rightlist = recursive_merge_sort(records[mid:], sortby, ascending)
+
+    sorted_list = []
+    left_pointer = 0
+    right_pointer = 0
+
+    while left_pointer < len(leftlist) and right_pointer < len(rightlist):
+        left_value = leftlist[left_pointer][sort_index]
+        right_value = rightlist[right_pointer][sort_index]
+
+        if sortby == 'date':
+            try:
+                left_date = datetime.strptime(left_value, "%Y-%m-%d")
+                right_date = datetime.strptime(right_value, "%Y-%m-%d")
+                left_value = left_date
+                right_value = right_date
+            except ValueError:
+                pass
+        elif str(left_value).isdigit():
+            left_value = int(left_value)
+            right_value = int(right_value)
+
+        if ascending:
+            if left_value < right_value:
+                sorted_list.append(leftlist[left_pointer])
+                left_pointer += 1
+            else:
+                sorted_list.append(rightlist[right_pointer])
+                right_pointer += 1
+        else:
+            if left_value > right_value:
+                sorted_list.append(leftlist[left_pointer])
+                left_pointer += 1
+            else:
+                sorted_list.append(rightlist[right_pointer])
+                right_pointer += 1
+
+    sorted_list.extend(leftlist[left_pointer:])
+    sorted_list.extend(rightlist[right_pointer:])
+    return sorted_list
+
+
+def benchmark_sort(count=100000, repeat=3):
+    random.seed(1)
+    start = datetime(2020, 1, 1)
+    bookings = [(booking_id, (start + timedelta(days=random.randrange(1800))).strftime("%Y-%m-%d"),
+                 f"{random.randrange(9, 18):02d}:00") for booking_id in range(1, count + 1)]
+    legacy_records = [(booking[0], f"{booking[1]} {booking[2]}", booking[1]) for booking in bookings]
+
+    def best_of(sort):
+        times = []
+        for i in range(repeat):
+            started = perf_counter()
+            sort()
+            times.append(perf_counter() - started)
+        return min(times)
+
+    legacy = best_of(lambda: recursive_merge_sort(legacy_records, sortby='date', ascending=False))
+    keyed = best_of(lambda: sort_records(bookings, (1, False)))
+    multi = best_of(lambda: sort_records(bookings, (1, False), (2, True), (0, True)))
+    print(f"{count} bookings, best of {repeat}")
+    print(f"recursive merge_sort by date:       {legacy * 1000:8.1f} ms")
+    print(f"sort_records by date:               {keyed * 1000:8.1f} ms  ({legacy / keyed:.0f}x)")
+    print(f"sort_records by date, time, id:     {multi * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    benchmark_sort(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)